@@ -0,0 +1,124 @@
+"""
+Dense (area, year) aggregates shared by the summary and chart code.
+
+``AggregateCube`` groups the dataset once: every metric column becomes an
+areas x years matrix of counts, sums and means. Areas are matched
+case-insensitively, like the old per-request ``str.lower()`` filters, and
+rows without an area go to an extra bucket so dataset-wide totals still
+include them. After that, per-area lookups are O(1).
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .area_index import area_key_codes
+from .normalize import year_values
+
+
+class AggregateCube:
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        area_col: Optional[str],
+        year_col: Optional[str],
+        metric_cols: Iterable[Optional[str]],
+    ):
+        n = len(df)
+
+        if area_col is not None:
+            area_codes, area_keys = area_key_codes(df[area_col])
+        else:
+            area_codes, area_keys = np.full(n, -1, dtype=np.intp), []
+        self.area_keys: List[str] = list(area_keys)  # row i of every matrix
+        self._area_index: Dict[str, int] = {k: i for i, k in enumerate(area_keys)}
+        n_areas = len(self._area_index) + 1  # last row holds rows with no area
+        area_codes = np.where(area_codes < 0, n_areas - 1, area_codes)
+
+        years = year_values(df[year_col]) if year_col is not None else None
+        if years is not None:
+            # Normalized datasets already carry an integer year column; NA years are skipped.
+            values, valid = years
+            self.years, year_codes = np.unique(values[valid], return_inverse=True)
+        elif year_col is not None:
+            parsed = pd.to_numeric(df[year_col].astype(str).str.strip(), errors="coerce")
+            valid = np.isfinite(parsed.to_numpy(dtype=float))
+            years = np.trunc(parsed.to_numpy(dtype=float)[valid]).astype(np.int64)
+            self.years, year_codes = np.unique(years, return_inverse=True)
+        else:
+            valid = np.zeros(n, dtype=bool)
+            self.years, year_codes = np.array([], dtype=np.int64), np.array([], dtype=np.intp)
+        n_years = len(self.years)
+
+        self._area_has_rows = np.bincount(area_codes, minlength=n_areas) > 0
+        cells = area_codes[valid] * n_years + year_codes
+        shape = (n_areas, n_years)
+        self.rows = np.bincount(cells, minlength=n_areas * n_years).reshape(shape)
+
+        self.counts: Dict[str, np.ndarray] = {}
+        self.sums: Dict[str, np.ndarray] = {}
+        self.means: Dict[str, np.ndarray] = {}
+        for col in metric_cols:
+            if col is None or col in self.counts:
+                continue
+            values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)[valid]
+            present = ~np.isnan(values)
+            counts = np.bincount(cells[present], minlength=n_areas * n_years).reshape(shape)
+            sums = np.bincount(
+                cells[present], weights=values[present], minlength=n_areas * n_years
+            ).reshape(shape)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+            self.counts[col], self.sums[col], self.means[col] = counts, sums, means
+
+    def area_code(self, area: str) -> Optional[int]:
+        return self._area_index.get(str(area).lower())
+
+    def has_area(self, area: str) -> bool:
+        code = self.area_code(area)
+        return code is not None and bool(self._area_has_rows[code])
+
+    def years_for(self, area: str) -> List[int]:
+        """Sorted years that have at least one row for ``area``."""
+        code = self.area_code(area)
+        if code is None:
+            return []
+        return [int(y) for y in self.years[self.rows[code] > 0]]
+
+    def mean(self, col: Optional[str], area: str, year: Optional[int]) -> Optional[float]:
+        code = self.area_code(area)
+        if col not in self.means or code is None or year is None:
+            return None
+        pos = np.searchsorted(self.years, year)
+        if pos >= len(self.years) or self.years[pos] != year:
+            return None
+        value = self.means[col][code, pos]
+        return None if np.isnan(value) else float(value)
+
+    def _rows(self, row_mask: np.ndarray, counts, sums, metrics: Dict[str, Optional[str]]):
+        out = []
+        for j in np.flatnonzero(row_mask):
+            item = {"year": int(self.years[j])}
+            for key, col in metrics.items():
+                if col is None:
+                    continue
+                c = counts[col][j] if col in counts else 0
+                item[key] = float(sums[col][j] / c) if c else None
+            out.append(item)
+        return out
+
+    def series(self, area: str, metrics: Dict[str, Optional[str]]) -> List[Dict]:
+        """Per-year chart rows for one area, e.g. metrics={"price": col, "demand": col}."""
+        code = self.area_code(area)
+        if code is None:
+            return []
+        counts = {c: v[code] for c, v in self.counts.items()}
+        sums = {c: v[code] for c, v in self.sums.items()}
+        return self._rows(self.rows[code] > 0, counts, sums, metrics)
+
+    def dataset_series(self, metrics: Dict[str, Optional[str]]) -> List[Dict]:
+        """Per-year chart rows across every area."""
+        counts = {c: v.sum(axis=0) for c, v in self.counts.items()}
+        sums = {c: v.sum(axis=0) for c, v in self.sums.items()}
+        return self._rows(self.rows.sum(axis=0) > 0, counts, sums, metrics)
@@ -0,0 +1,67 @@
+"""
+Row index over the (categorical) area column.
+
+Normalization stores the area column as a categorical. ``area_key_codes``
+maps its categories to case-insensitive area keys without touching the
+rows, and ``AreaIndex`` keeps row positions sorted by (area, year) so an
+area's rows are one contiguous slice of that ordering.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .normalize import year_values
+
+
+def area_key_codes(series: pd.Series) -> Tuple[np.ndarray, List[str]]:
+    """Per-row code of the lowercased area (-1 for missing) and the distinct keys."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        lowered = pd.Index(series.cat.categories.astype(str)).str.lower()
+        key_codes, keys = pd.factorize(lowered)
+        cat_codes = series.cat.codes.to_numpy()
+        # Index only present codes: with no categories, key_codes is empty.
+        codes = np.full(len(cat_codes), -1, dtype=np.intp)
+        present = cat_codes >= 0
+        codes[present] = key_codes[cat_codes[present]]
+        return codes, list(keys)
+
+    lowered = series.astype(str).str.lower().where(series.notna())
+    codes, keys = pd.factorize(lowered, use_na_sentinel=True)
+    return codes, list(keys)
+
+
+class AreaIndex:
+    def __init__(self, df: pd.DataFrame, area_col: Optional[str], year_col: Optional[str]):
+        if area_col is None:
+            codes, keys = np.full(len(df), -1, dtype=np.intp), []
+        else:
+            codes, keys = area_key_codes(df[area_col])
+        self._lookup: Dict[str, int] = {k: i for i, k in enumerate(keys)}
+
+        years = year_values(df[year_col]) if year_col is not None else None
+        if years is not None:
+            # Rows without a valid year come last within their area.
+            values, valid = years
+            self._order = np.lexsort((values, ~valid, codes))
+        else:
+            self._order = np.argsort(codes, kind="stable")
+
+        sorted_codes = codes[self._order]
+        targets = np.arange(len(keys))
+        self._starts = np.searchsorted(sorted_codes, targets, side="left")
+        self._ends = np.searchsorted(sorted_codes, targets, side="right")
+
+    def rows(self, area: str) -> np.ndarray:
+        """Row positions for ``area`` (case-insensitive), ordered by year."""
+        code = self._lookup.get(str(area).lower())
+        if code is None:
+            return self._order[:0]
+        return self._order[self._starts[code]:self._ends[code]]
+
+    def rows_for(self, areas: List[str]) -> np.ndarray:
+        """Row positions of several areas, area by area."""
+        if not areas:
+            return self._order[:0]
+        return np.concatenate([self.rows(area) for area in areas])
@@ -0,0 +1,119 @@
+"""
+Multi-pattern matching of area names against a free-text query.
+
+``AreaMatcher`` compiles every distinct value of the location column into
+an Aho-Corasick automaton over lowercased area names. The automaton's
+alphabet is words rather than characters: hits can only start and end on
+word boundaries, and the trie stays small with tens of thousands of
+localities. A query is scanned once whatever the number of areas, and
+overlapping hits are resolved in favour of the longest name.
+"""
+
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from .schema import schema_for
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD_RE.findall((text or "").lower())
+
+
+class AreaMatcher:
+    """Word-level Aho-Corasick automaton over lowercased area names."""
+
+    def __init__(self, names: Iterable[str], column: Optional[str] = None):
+        self.column = column
+        # Original spelling of each pattern, in first-seen order; that order
+        # is also the order results are reported in.
+        self.names: List[str] = []
+        self._lengths: List[int] = []
+
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Pattern ids ending exactly at a node; shorter suffix matches are
+        # reached through _dict_link instead of being copied down the trie.
+        self._out: List[List[int]] = [[]]
+        self._dict_link: List[int] = [-1]
+
+        seen = set()
+        for name in names:
+            key = tuple(tokenize(name))
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            self._add(key, len(self.names))
+            self.names.append(name)
+            self._lengths.append(len(key))
+
+        self._build_links()
+
+    @classmethod
+    def for_frame(cls, df: pd.DataFrame) -> "AreaMatcher":
+        column = schema_for(df).area
+        if column is None:
+            return cls([], column=None)
+        values = (v for v in df[column].dropna().unique() if isinstance(v, str))
+        return cls(values, column=column)
+
+    def _add(self, key: Tuple[str, ...], pattern_id: int) -> None:
+        node = 0
+        for word in key:
+            nxt = self._goto[node].get(word)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][word] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._dict_link.append(-1)
+            node = nxt
+        self._out[node].append(pattern_id)
+
+    def _build_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for word, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and word not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(word, 0)
+                self._fail[child] = target if target != child else 0
+                fail = self._fail[child]
+                self._dict_link[child] = fail if self._out[fail] else self._dict_link[fail]
+
+    def matches(self, query: str) -> List[Tuple[int, int, int]]:
+        """All (start, end, pattern id) hits, as word offsets into the query."""
+        hits = []
+        node = 0
+        for i, word in enumerate(tokenize(query)):
+            while node and word not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(word, 0)
+
+            out = node
+            while out > 0:
+                for pid in self._out[out]:
+                    hits.append((i - self._lengths[pid] + 1, i + 1, pid))
+                out = self._dict_link[out]
+        return hits
+
+    def find(self, query: str) -> List[str]:
+        """Areas mentioned in ``query``; overlapping hits keep the longest name."""
+        hits = sorted(self.matches(query), key=lambda h: (h[0], -(h[1] - h[0])))
+        chosen = set()
+        end = -1
+        for start, stop, pid in hits:
+            if start < end:
+                continue
+            chosen.add(pid)
+            end = stop
+        return [self.names[pid] for pid in sorted(chosen)]
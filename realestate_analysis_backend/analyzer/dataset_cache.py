@@ -0,0 +1,171 @@
+import hashlib
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+from django.conf import settings
+
+from . import shared_dataset, snapshot
+from .normalize import NormalizationReport, normalize_frame
+from .xlsx_reader import read_xlsx
+
+
+Fingerprint = Tuple[str, int, int]
+
+
+def file_fingerprint(path: str) -> Fingerprint:
+    """Return (absolute path, size, mtime_ns) identifying one version of a file."""
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+
+def fingerprint_version(fp: Fingerprint) -> str:
+    """Short stable version string for a fingerprint."""
+    return hashlib.sha1(repr(fp).encode("utf-8")).hexdigest()[:16]
+
+
+def read_dataset(path_or_buffer, select=None) -> Tuple[pd.DataFrame, NormalizationReport]:
+    """
+    Parse an Excel workbook and normalize it for analysis.
+
+    ``select`` restricts the read as in ``read_xlsx`` (fast reader only).
+    """
+    if select is not None:
+        return normalize_frame(read_xlsx(path_or_buffer, select))
+    if settings.ANALYZER_FAST_XLSX_READER:
+        return normalize_frame(read_xlsx(path_or_buffer))
+    return normalize_frame(pd.read_excel(path_or_buffer, engine="openpyxl"))
+
+
+def _load_snapshot(snapshot_dir: str) -> Tuple[pd.DataFrame, NormalizationReport]:
+    meta = snapshot.read_meta(snapshot_dir) or {}
+    report = NormalizationReport.from_dict(meta.get("normalization"))
+    return snapshot.load_snapshot(snapshot_dir), report
+
+
+def load_dataset(path: str) -> Tuple[pd.DataFrame, NormalizationReport]:
+    """
+    Load a workbook, preferring the cheapest fresh copy.
+
+    Order: the host-wide shared snapshot, the local snapshot next to the
+    file, then a full .xlsx parse. Whatever was loaded is published to the
+    shared store so other workers can attach to it.
+    """
+    shared_dir = shared_dataset.attach(path)
+    if shared_dir is not None:
+        try:
+            return _load_snapshot(shared_dir)
+        except (OSError, ValueError):
+            pass
+
+    loaded = None
+    snapshot_dir = snapshot.snapshot_path(path)
+    try:
+        if snapshot.is_fresh(snapshot_dir, path):
+            loaded = _load_snapshot(snapshot_dir)
+    except (OSError, ValueError):
+        pass
+    if loaded is None:
+        loaded = read_dataset(path)
+
+    df, report = loaded
+    try:
+        shared_dir = shared_dataset.publish(path, df, report)
+    except (OSError, ValueError) as e:
+        print("SHARED DATASET ERROR:", e)
+        return loaded
+    if shared_dir is not None:
+        # Re-open from the shared copy so this worker holds mapped pages, not a private copy.
+        return _load_snapshot(shared_dir)
+    return loaded
+
+
+class Dataset:
+    """
+    A parsed DataFrame together with the file version it was built from.
+
+    Structures derived from the frame (matchers, indexes, aggregates) are
+    memoized on the dataset with ``derive`` so they are built once per version.
+    A ``partial`` dataset holds only the rows and columns one query needs.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        version: Optional[str],
+        report: Optional[NormalizationReport] = None,
+        partial: bool = False,
+    ):
+        self.df = df
+        self.version = version
+        self.report = report or NormalizationReport()
+        self.partial = partial
+        self._derived: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def derive(self, key: str, build: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = build()
+            return self._derived[key]
+
+
+class DatasetCache:
+    """
+    Process-wide cache of parsed datasets keyed by file path.
+
+    An entry is reused only while the file's size and mtime are unchanged,
+    so editing or replacing the workbook invalidates it automatically.
+    Cached frames are shared between requests and must be treated as read-only.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], Tuple[pd.DataFrame, NormalizationReport]] = load_dataset,
+    ):
+        self._loader = loader
+        self._entries: Dict[str, Tuple[Fingerprint, Dataset]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str) -> Dataset:
+        fp = file_fingerprint(path)
+        with self._lock:
+            entry = self._entries.get(fp[0])
+            if entry is not None and entry[0] == fp:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        df, report = self._loader(path)
+        dataset = Dataset(df, fingerprint_version(fp), report)
+        with self._lock:
+            self._entries[fp[0]] = (fp, dataset)
+        return dataset
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "datasets": [
+                    {
+                        # Never the server path.
+                        "name": os.path.basename(path),
+                        "version": dataset.version,
+                        "rows": len(dataset.df),
+                        "rejected_rows": len(dataset.report.rejected_rows),
+                    }
+                    for path, (_, dataset) in self._entries.items()
+                ],
+            }
+
+
+dataset_cache = DatasetCache()
@@ -0,0 +1,161 @@
+"""
+Streaming file exports of analysis results.
+
+Every format is produced ``EXPORT_CHUNK_ROWS`` rows at a time:
+
+* ``csv`` and ``ndjson`` are generated chunk by chunk straight into a
+  ``StreamingHttpResponse``;
+* ``xlsx`` is written with xlsxwriter in ``constant_memory`` mode and
+  ``parquet`` with one row group per chunk. Both formats need a seekable
+  file, so they go to an anonymous temp file that is streamed with a
+  ``FileResponse`` and deleted when the response is closed.
+
+Parquet needs ``pyarrow`` (in requirements.txt). It is imported lazily, so
+an install without it still serves the other formats.
+"""
+
+import tempfile
+from typing import Any, Callable, Dict, Iterator, List
+
+import pandas as pd
+import xlsxwriter
+from django.http import FileResponse, StreamingHttpResponse
+
+from .encoders import column_values, dumps, frame_records
+
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+EXPORT_CHUNK_ROWS = 5000
+# Sheet size limits of the XLSX format; xlsxwriter ignores cells beyond them.
+XLSX_MAX_ROWS = 1_048_576
+XLSX_MAX_COLUMNS = 16_384
+EXPORT_FILENAME = "filtered_data"
+
+
+class ExportError(ValueError):
+    """The requested export cannot be produced (unknown format, missing dependency)."""
+
+
+def _chunks(df: pd.DataFrame) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+        yield df.iloc[start:start + EXPORT_CHUNK_ROWS]
+
+
+def _xlsx_column(series: pd.Series) -> List[Any]:
+    # Keep real datetimes (Timestamps) so Excel stores dates rather than ISO strings.
+    if isinstance(series.dtype, pd.DatetimeTZDtype) or series.dtype.kind == "M":
+        return [None if pd.isna(v) else v for v in series.astype(object)]
+    return column_values(series)
+
+
+def write_xlsx(df: pd.DataFrame, fileobj) -> None:
+    if len(df) + 1 > XLSX_MAX_ROWS or df.shape[1] > XLSX_MAX_COLUMNS:
+        raise ExportError(
+            f"{len(df)} rows x {df.shape[1]} columns do not fit in one Excel sheet "
+            f"(max {XLSX_MAX_ROWS - 1} rows, {XLSX_MAX_COLUMNS} columns); use format=csv or parquet."
+        )
+    workbook = xlsxwriter.Workbook(fileobj, {
+        "constant_memory": True,
+        # Cell text is data: never turn it into links or formulas.
+        "strings_to_urls": False,
+        "strings_to_formulas": False,
+        "default_date_format": "yyyy-mm-dd hh:mm:ss",
+        "remove_timezone": True,
+    })
+    worksheet = workbook.add_worksheet()
+    worksheet.write_row(0, 0, [str(c) for c in df.columns], workbook.add_format({"bold": True}))
+
+    row = 1
+    for chunk in _chunks(df):
+        columns = [_xlsx_column(chunk.iloc[:, i]) for i in range(chunk.shape[1])]
+        for values in zip(*columns):
+            worksheet.write_row(row, 0, values)
+            row += 1
+
+    workbook.close()
+
+
+def _file_response(write: Callable, df: pd.DataFrame, filename: str, content_type: str) -> FileResponse:
+    tmp = tempfile.TemporaryFile()
+    try:
+        write(df, tmp)
+    except Exception:
+        tmp.close()
+        raise
+    tmp.seek(0)
+    return FileResponse(tmp, as_attachment=True, filename=filename, content_type=content_type)
+
+
+def xlsx_response(df: pd.DataFrame, filename: str = f"{EXPORT_FILENAME}.xlsx") -> FileResponse:
+    return _file_response(write_xlsx, df, filename, XLSX_CONTENT_TYPE)
+
+
+def iter_csv(df: pd.DataFrame) -> Iterator[bytes]:
+    yield df.iloc[:0].to_csv(index=False).encode("utf-8")
+    for chunk in _chunks(df):
+        yield chunk.to_csv(index=False, header=False).encode("utf-8")
+
+
+def iter_ndjson(df: pd.DataFrame) -> Iterator[bytes]:
+    for chunk in _chunks(df):
+        yield "".join(dumps(row) + "\n" for row in frame_records(chunk)).encode("utf-8")
+
+
+def _text_column(series: pd.Series) -> List[Any]:
+    return [None if v is None else v if isinstance(v, str) else str(v) for v in column_values(series)]
+
+
+def write_parquet(df: pd.DataFrame, fileobj) -> None:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError("Parquet export requires the pyarrow package.")
+
+    # Object columns (e.g. numbers mixed with "n/a") are written as text.
+    text = [name for name in df.columns if df[name].dtype == object]
+    schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+    for name in text:
+        i = schema.get_field_index(str(name))
+        schema = schema.set(i, pa.field(str(name), pa.string()))
+
+    try:
+        with pq.ParquetWriter(fileobj, schema) as writer:
+            for chunk in _chunks(df):
+                if text:
+                    chunk = chunk.copy()
+                    for name in text:
+                        chunk[name] = _text_column(chunk[name])
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    except pa.ArrowException as e:
+        raise ExportError(f"Cannot write these columns as Parquet: {e}")
+
+
+def _streaming_response(chunks: Iterator[bytes], filename: str, content_type: str) -> StreamingHttpResponse:
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+EXPORT_FORMATS: Dict[str, Callable[[pd.DataFrame], Any]] = {
+    "xlsx": xlsx_response,
+    "csv": lambda df: _streaming_response(
+        iter_csv(df), f"{EXPORT_FILENAME}.csv", "text/csv; charset=utf-8"
+    ),
+    "ndjson": lambda df: _streaming_response(
+        iter_ndjson(df), f"{EXPORT_FILENAME}.ndjson", "application/x-ndjson"
+    ),
+    "parquet": lambda df: _file_response(
+        write_parquet, df, f"{EXPORT_FILENAME}.parquet", "application/vnd.apache.parquet"
+    ),
+}
+
+
+def export_response(df: pd.DataFrame, fmt: str = "xlsx"):
+    """Streaming download of ``df`` in ``fmt`` (xlsx, csv, ndjson or parquet)."""
+    export = EXPORT_FORMATS.get((fmt or "xlsx").lower())
+    if export is None:
+        raise ExportError(
+            f"Unsupported format {fmt!r}; choose one of {', '.join(EXPORT_FORMATS)}."
+        )
+    return export(df)
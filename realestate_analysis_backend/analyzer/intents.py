@@ -0,0 +1,309 @@
+"""
+Structured intents recognized in free-text queries.
+
+``parse_intent`` reads the query words (as ``tokenize`` splits them) and
+the detected areas and recognizes:
+
+* ranking: "Which area has highest demand?", "top 5 cheapest areas";
+* comparison: "Compare Wakad and Aundh", "Wakad vs Aundh price";
+* growth over N years: "price growth of Wakad over 3 years", or, with no
+  area or a superlative, areas ranked by growth;
+* single-area trend: "Average price trend for Wakad".
+
+``run_intent`` answers the intent from the ``AggregateCube`` areas x years
+mean matrices. Top-k selection uses ``np.argpartition``, so ranking
+thousands of localities costs microseconds.
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .aggregates import AggregateCube
+from .area_matcher import tokenize
+
+
+METRIC_WORDS = {
+    "price": {"price", "prices", "rate", "rates", "expensive", "costly", "costliest",
+              "cheap", "cheaper", "cheapest", "affordable", "pricey", "priciest"},
+    "demand": {"demand", "sold", "sales", "sale", "selling", "popular"},
+}
+DESC_WORDS = {"highest", "most", "top", "max", "maximum", "best", "largest", "biggest",
+              "expensive", "costliest", "priciest", "popular", "fastest"}
+ASC_WORDS = {"lowest", "least", "bottom", "min", "minimum", "worst", "smallest",
+             "cheapest", "cheap", "cheaper", "affordable", "slowest"}
+GROWTH_WORDS = {"growth", "grew", "grown", "grow", "growing", "increase", "increased",
+                "rise", "rose", "appreciation", "appreciated", "change", "changed", "cagr"}
+COMPARE_WORDS = {"compare", "comparison", "vs", "versus", "between", "difference", "against"}
+TREND_WORDS = {"trend", "trends", "history", "historical", "over", "time", "evolution"}
+PLURAL_AREA_WORDS = {"areas", "localities", "locations", "places", "neighbourhoods",
+                     "neighborhoods", "regions"}
+
+METRIC_LABELS = {"price": "avg flat price", "demand": "avg total sold"}
+METRIC_FORMATS = {"price": "{:,.2f}", "demand": "{:,.0f}"}
+
+DEFAULT_PLURAL_K = 5
+MAX_K = 50
+
+_NUMBER_RE = re.compile(r"^\d{1,3}$")
+
+
+class Intent:
+    """What the query asks for; ``areas`` are the areas it names."""
+
+    def __init__(self, kind: str, metric: str, descending: bool = True, k: int = 1,
+                 years: Optional[int] = None, areas: Optional[List[str]] = None):
+        self.kind = kind  # ranking, growth_ranking, comparison, growth or trend
+        self.metric = metric
+        self.descending = descending
+        self.k = k
+        self.years = years
+        self.areas = list(areas or [])
+
+
+class IntentAnswer:
+    def __init__(self, intent: Intent, summary: str, areas: List[str], results: List[Dict[str, Any]]):
+        self.intent = intent
+        self.summary = summary
+        self.areas = areas
+        self.results = results
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": self.intent.kind,
+            "metric": self.intent.metric,
+            "results": self.results,
+        }
+
+
+def _number_near(tokens: List[str], before: set, after: set) -> Optional[int]:
+    """A small number right after a word in ``before`` or right before one in ``after``."""
+    for i, tok in enumerate(tokens):
+        if not _NUMBER_RE.match(tok) or int(tok) <= 0:
+            continue
+        if (i > 0 and tokens[i - 1] in before) or (i + 1 < len(tokens) and tokens[i + 1] in after):
+            return int(tok)
+    return None
+
+
+def parse_intent(query: str, areas: List[str]) -> Optional[Intent]:
+    tokens = tokenize(query)
+    words = set(tokens)
+
+    metric = next((m for m, ws in METRIC_WORDS.items() if words & ws), None)
+    # An ascending word wins: "most affordable", "least expensive", "top 5 cheapest".
+    descending = not (words & ASC_WORDS)
+    ranked = bool(words & (DESC_WORDS | ASC_WORDS))
+
+    k = _number_near(tokens, {"top", "bottom", "best", "worst"}, PLURAL_AREA_WORDS)
+    if k is None:
+        k = DEFAULT_PLURAL_K if words & PLURAL_AREA_WORDS else 1
+    k = min(k, MAX_K)
+    years = _number_near(tokens, {"last", "past"}, {"year", "years", "yr", "yrs"})
+
+    if words & GROWTH_WORDS:
+        if ranked or not areas:
+            candidates = areas if len(areas) > 1 else []
+            return Intent("growth_ranking", metric or "price", descending, k, years, candidates)
+        return Intent("growth", metric or "price", years=years, areas=areas)
+
+    if ranked and metric and len(areas) != 1:
+        return Intent("ranking", metric, descending, k, areas=areas if len(areas) > 1 else [])
+
+    if len(areas) > 1 and words & COMPARE_WORDS:
+        return Intent("comparison", metric or "price", areas=areas)
+
+    if len(areas) == 1 and words & TREND_WORDS:
+        return Intent("trend", metric or "price", years=years, areas=areas)
+
+    return None
+
+
+def needs_every_area(query: str) -> bool:
+    """Whether the answer may involve areas the query does not name (rankings)."""
+    return bool(set(tokenize(query)) & (DESC_WORDS | ASC_WORDS))
+
+
+def top_k(values: np.ndarray, k: int, descending: bool = True) -> np.ndarray:
+    """Indices of the ``k`` best non-NaN ``values``, best first."""
+    idx = np.flatnonzero(~np.isnan(values))
+    if not len(idx):
+        return idx
+    keys = -values[idx] if descending else values[idx]
+    k = min(k, len(idx))
+    part = np.argpartition(keys, k - 1)[:k] if k < len(idx) else np.arange(len(idx))
+    return idx[part[np.argsort(keys[part], kind="stable")]]
+
+
+class _Answerer:
+    def __init__(self, intent: Intent, cube: AggregateCube, metrics: Dict[str, Optional[str]],
+                 names: Dict[str, str]):
+        self.intent = intent
+        self.cube = cube
+        self.col = metrics.get(intent.metric)
+        self.names = names
+        self.label = METRIC_LABELS[intent.metric]
+        self.fmt = METRIC_FORMATS[intent.metric].format
+
+    def name(self, code: int) -> str:
+        key = self.cube.area_keys[code]
+        return self.names.get(key, key)
+
+    def candidates(self) -> np.ndarray:
+        """Area rows in scope: the named areas, or every area (without the no-area bucket)."""
+        if self.intent.areas:
+            codes = [self.cube.area_code(a) for a in self.intent.areas]
+            return np.array([c for c in codes if c is not None], dtype=np.intp)
+        return np.arange(len(self.cube.area_keys))
+
+    def last_year(self, rows: np.ndarray) -> Optional[int]:
+        """Column of the latest year with data for any of ``rows``."""
+        present = np.flatnonzero(self.cube.counts[self.col][rows].sum(axis=0) > 0)
+        return int(present[-1]) if len(present) else None
+
+    def _growth_pct(self, rows: np.ndarray):
+        """(pct growth per row, start column, end column) over ``intent.years``."""
+        means = self.cube.means[self.col][rows]
+        end = self.last_year(rows)
+        if end is None:
+            return None
+        if self.intent.years:
+            start_year = int(self.cube.years[end]) - self.intent.years
+            start = int(np.searchsorted(self.cube.years, start_year))
+            if start >= len(self.cube.years) or self.cube.years[start] != start_year:
+                return None
+        else:
+            present = np.flatnonzero(self.cube.counts[self.col][rows].sum(axis=0) > 0)
+            start = int(present[0])
+        if start == end:
+            return None
+        first, last = means[:, start], means[:, end]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            pct = np.where(first > 0, (last - first) / first * 100.0, np.nan)
+        return pct, start, end
+
+    def answer(self) -> Optional[IntentAnswer]:
+        if self.col is None or self.col not in self.cube.means:
+            return None
+        rows = self.candidates()
+        if not len(rows):
+            return None
+        return getattr(self, self.intent.kind)(rows)
+
+    def ranking(self, rows: np.ndarray) -> Optional[IntentAnswer]:
+        j = self.last_year(rows)
+        if j is None:
+            return None
+        year = int(self.cube.years[j])
+        values = self.cube.means[self.col][rows, j]
+        best = rows[top_k(values, self.intent.k, self.intent.descending)]
+        results = [
+            {"area": self.name(c), "value": float(self.cube.means[self.col][c, j]), "year": year}
+            for c in best
+        ]
+        if not results:
+            return None
+
+        word = "highest" if self.intent.descending else "lowest"
+        if len(results) == 1:
+            r = results[0]
+            summary = f"{r['area']} has the {word} {self.label} in {year} ({self.fmt(r['value'])})."
+        else:
+            ranked = ", ".join(
+                f"{i}. {r['area']} ({self.fmt(r['value'])})" for i, r in enumerate(results, 1)
+            )
+            summary = f"Areas with the {word} {self.label} in {year}: {ranked}."
+        return IntentAnswer(self.intent, summary, [r["area"] for r in results], results)
+
+    def _growth_results(self, rows: np.ndarray, order: np.ndarray, pct, start: int, end: int):
+        means = self.cube.means[self.col]
+        return [
+            {
+                "area": self.name(rows[i]),
+                "growth_pct": float(pct[i]),
+                "from_year": int(self.cube.years[start]),
+                "to_year": int(self.cube.years[end]),
+                "from": float(means[rows[i], start]),
+                "to": float(means[rows[i], end]),
+            }
+            for i in order
+        ]
+
+    def growth_ranking(self, rows: np.ndarray) -> Optional[IntentAnswer]:
+        grown = self._growth_pct(rows)
+        if grown is None:
+            return None
+        pct, start, end = grown
+        results = self._growth_results(rows, top_k(pct, self.intent.k, self.intent.descending), pct, start, end)
+        if not results:
+            return None
+
+        word = "highest" if self.intent.descending else "lowest"
+        span = f"{results[0]['from_year']}-{results[0]['to_year']}"
+        ranked = ", ".join(f"{r['area']} ({r['growth_pct']:+.1f}%)" for r in results)
+        summary = f"The {word} {self.label} growth over {span}: {ranked}."
+        return IntentAnswer(self.intent, summary, [r["area"] for r in results], results)
+
+    def growth(self, rows: np.ndarray) -> Optional[IntentAnswer]:
+        grown = self._growth_pct(rows)
+        if grown is None:
+            return None
+        pct, start, end = grown
+        order = [i for i in range(len(rows)) if not np.isnan(pct[i])]
+        results = self._growth_results(rows, order, pct, start, end)
+        if not results:
+            return None
+
+        span = f"{results[0]['from_year']}-{results[0]['to_year']}"
+        changes = ", ".join(f"{r['area']} {r['growth_pct']:+.1f}%" for r in results)
+        summary = f"Change in {self.label} over {span}: {changes}."
+        return IntentAnswer(self.intent, summary, self.intent.areas, results)
+
+    def comparison(self, rows: np.ndarray) -> Optional[IntentAnswer]:
+        # Latest year in which every compared area has data.
+        common = np.flatnonzero((self.cube.counts[self.col][rows] > 0).all(axis=0))
+        if not len(common):
+            return None
+        j = int(common[-1])
+        year = int(self.cube.years[j])
+        values = self.cube.means[self.col][rows, j]
+        order = top_k(values, len(rows), descending=True)
+        results = [
+            {"area": self.name(rows[i]), "value": float(values[i]), "year": year} for i in order
+        ]
+        ranked = " > ".join(f"{r['area']} {self.fmt(r['value'])}" for r in results)
+        summary = f"Comparison of {self.label} in {year}: {ranked}."
+        return IntentAnswer(self.intent, summary, self.intent.areas, results)
+
+    def trend(self, rows: np.ndarray) -> Optional[IntentAnswer]:
+        grown = self._growth_pct(rows)
+        if grown is None:
+            return None
+        pct, start, end = grown
+        if np.isnan(pct[0]):
+            return None
+        r = self._growth_results(rows, [0], pct, start, end)[0]
+        span = r["to_year"] - r["from_year"]
+        cagr = ((r["to"] / r["from"]) ** (1.0 / span) - 1.0) * 100.0
+        summary = (
+            f"{r['area']} {self.label} went from {self.fmt(r['from'])} ({r['from_year']}) "
+            f"to {self.fmt(r['to'])} ({r['to_year']}), {r['growth_pct']:+.1f}% overall, "
+            f"{cagr:+.1f}% a year."
+        )
+        r["cagr_pct"] = cagr
+        return IntentAnswer(self.intent, summary, self.intent.areas, [r])
+
+
+def display_names(names: List[str]) -> Dict[str, str]:
+    """Lowercase area key -> spelling used in the dataset (first seen wins)."""
+    out: Dict[str, str] = {}
+    for name in names:
+        out.setdefault(str(name).lower(), name)
+    return out
+
+
+def run_intent(intent: Intent, cube: AggregateCube, metrics: Dict[str, Optional[str]],
+               names: Dict[str, str]) -> Optional[IntentAnswer]:
+    """Answer ``intent`` from ``cube``; None when the data cannot answer it."""
+    return _Answerer(intent, cube, metrics, names).answer()
@@ -0,0 +1,276 @@
+"""
+LLM rewrite of the template summary, bounded by a deadline.
+
+The Groq call runs on a small module-level thread pool, through one
+shared client per API key. The request waits at most
+``ANALYZER_LLM_TIMEOUT`` seconds and otherwise answers with the template
+summary; ``start_llm_summary`` lets the caller keep working while the
+call is in flight. Every rewrite, including one that finishes after its
+deadline, is stored in ``summary_cache`` and served to later identical
+requests. Identical requests arriving while a call is in flight share it
+instead of starting another.
+
+At most ``ANALYZER_LLM_MAX_CONCURRENCY`` calls are in flight; requests
+beyond that, or made while the circuit breaker is open after repeated
+failures, get the template summary without calling out.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from django.conf import settings
+from groq import Groq
+
+from .llm_cache import prompt_key, summary_cache
+
+
+LLM_MODEL = "grok-2-1212"
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing upstream for a while.
+
+    After ``threshold`` consecutive failures the circuit opens and
+    ``allow`` refuses calls for ``cooldown`` seconds. Then a single trial
+    call is let through: success closes the circuit, failure reopens it.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._trial or time.monotonic() >= self._opened_at + self.cooldown:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() < self._opened_at + self.cooldown:
+                return False
+            self._trial = True
+            return True
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self._trial = False
+            if ok:
+                self._failures = 0
+                self._opened_at = None
+                return
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.ANALYZER_LLM_MAX_CONCURRENCY, thread_name_prefix="llm"
+)
+# One slot per in-flight call; requests beyond the cap skip the LLM
+# instead of queueing behind calls that would outlive their deadline.
+_slots = threading.BoundedSemaphore(settings.ANALYZER_LLM_MAX_CONCURRENCY)
+breaker = CircuitBreaker(
+    settings.ANALYZER_LLM_BREAKER_THRESHOLD, settings.ANALYZER_LLM_BREAKER_COOLDOWN
+)
+
+_lock = threading.Lock()
+_clients: Dict[Tuple[str, Optional[str]], Groq] = {}
+_pending: Dict[str, Tuple[Future, Dict[str, bool]]] = {}
+_counters = {
+    "success": 0, "timeout": 0, "error": 0, "late": 0, "cached": 0, "skipped": 0,
+    "shed": 0, "circuit_open": 0,
+}
+
+
+def rewrite_prompt(areas: List[str], base_summary: str) -> str:
+    return f"""
+Rewrite this real estate summary in a cleaner, more professional way.
+Do NOT modify numbers or add new information.
+
+Areas: {areas}
+Original Summary:
+{base_summary}
+        """
+
+
+def _count(outcome: str) -> None:
+    with _lock:
+        _counters[outcome] += 1
+
+
+def get_client(api_key: str) -> Groq:
+    """Shared client per API key, keeping its connection pool alive between calls."""
+    key = (api_key, settings.GROK_BASE_URL)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            # Our own httpx client: keep-alive pool sized to the call cap
+            # (and groq 0.6 cannot build one against httpx >= 0.28).
+            http_client = httpx.Client(
+                timeout=settings.ANALYZER_LLM_CALL_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.ANALYZER_LLM_MAX_CONCURRENCY,
+                    max_keepalive_connections=settings.ANALYZER_LLM_MAX_CONCURRENCY,
+                ),
+            )
+            client = _clients[key] = Groq(
+                api_key=api_key,
+                base_url=settings.GROK_BASE_URL,
+                timeout=settings.ANALYZER_LLM_CALL_TIMEOUT,
+                max_retries=0,
+                http_client=http_client,
+            )
+        return client
+
+
+def _call_llm(api_key: str, prompt: str) -> str:
+    response = get_client(api_key).chat.completions.create(
+        model=LLM_MODEL,
+        messages=[
+            {"role": "system", "content": "Rewrite real estate analysis clearly and professionally."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.4,
+        max_tokens=200
+    )
+    return response.choices[0].message.content.strip()
+
+
+def _account_late(future: Future, state: Dict[str, bool]) -> None:
+    with _lock:
+        if not state["timed_out"] or state["kept"]:
+            return
+        state["kept"] = True
+        if future.exception() is not None:
+            print("GROK LLM ERROR:", future.exception())
+            return
+        _counters["late"] += 1
+
+
+def _finished(prompt: str, key: str, future: Future, state: Dict[str, bool]) -> None:
+    """Done-callback: cache the rewrite, whether or not anyone still waits for it."""
+    with _lock:
+        if _pending.get(prompt, (None,))[0] is future:
+            del _pending[prompt]
+    _slots.release()
+    breaker.record(future.exception() is None)
+    if future.exception() is None:
+        summary_cache.set(key, LLM_MODEL, future.result())
+    _account_late(future, state)
+
+
+def _submit(api_key: str, prompt: str, key: str) -> Optional[Tuple[Future, Dict[str, bool]]]:
+    """
+    Start the call for ``prompt``, or join the one already in flight.
+
+    Returns None when the call is refused: circuit open or no free slot.
+    """
+    with _lock:
+        if prompt in _pending:
+            return _pending[prompt]
+        if not _slots.acquire(blocking=False):
+            _counters["shed"] += 1
+            return None
+        if not breaker.allow():
+            _slots.release()
+            _counters["circuit_open"] += 1
+            return None
+        future = _executor.submit(_call_llm, api_key, prompt)
+        state = {"timed_out": False, "kept": False}
+        _pending[prompt] = (future, state)
+    future.add_done_callback(lambda f: _finished(prompt, key, f, state))
+    return future, state
+
+
+class SummaryRequest:
+    """
+    LLM rewrite started in the background.
+
+    ``result`` waits for whatever is left of the deadline, counted from
+    when the call was started, so the caller can do other work meanwhile.
+    ``final`` tells whether the text is settled: False when the template
+    summary stands in for a rewrite that timed out, failed or was refused.
+    """
+
+    def __init__(self, text: str, future: Optional[Future] = None,
+                 state: Optional[Dict[str, bool]] = None, deadline: float = 0.0,
+                 final: bool = True):
+        self._text = text
+        self._future = future
+        self._state = state
+        self._deadline = deadline
+        self.final = final and future is None
+
+    def result(self) -> str:
+        future, self._future = self._future, None
+        if future is None:
+            return self._text
+
+        try:
+            text = future.result(timeout=max(self._deadline - time.monotonic(), 0))
+        except TimeoutError:
+            with _lock:
+                self._state["timed_out"] = True
+            if future.done():
+                # Finished between the timeout and the flag.
+                _account_late(future, self._state)
+            _count("timeout")
+            return self._text
+        except Exception as e:
+            print("GROK LLM ERROR:", e)
+            _count("error")
+            return self._text
+
+        _count("success")
+        self._text = text
+        self.final = True
+        return text
+
+
+def start_llm_summary(areas: List[str], base_summary: str, timeout: Optional[float] = None) -> SummaryRequest:
+    """Start the rewrite of ``base_summary``; cached, skipped or refused calls resolve at once."""
+    api_key = os.getenv("GROK_API_KEY")
+    if not api_key:
+        _count("skipped")
+        return SummaryRequest(base_summary)
+
+    prompt = rewrite_prompt(areas, base_summary)
+    key = prompt_key(LLM_MODEL, prompt)
+    cached = summary_cache.get(key)
+    if cached is not None:
+        _count("cached")
+        return SummaryRequest(cached)
+
+    if timeout is None:
+        timeout = settings.ANALYZER_LLM_TIMEOUT
+    submitted = _submit(api_key, prompt, key)
+    if submitted is None:
+        return SummaryRequest(base_summary, final=False)
+    future, state = submitted
+    return SummaryRequest(base_summary, future, state, time.monotonic() + timeout)
+
+
+def generate_llm_summary(areas: List[str], base_summary: str, timeout: Optional[float] = None) -> str:
+    """LLM rewrite of ``base_summary``, or ``base_summary`` itself on timeout/error."""
+    return start_llm_summary(areas, base_summary, timeout).result()
+
+
+def llm_stats() -> Dict[str, object]:
+    with _lock:
+        counters = dict(_counters, pending=len(_pending))
+    return dict(counters, circuit=breaker.state, cache=summary_cache.stats())
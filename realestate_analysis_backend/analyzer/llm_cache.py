@@ -0,0 +1,114 @@
+"""
+Cache of LLM summary rewrites.
+
+The prompt depends only on the detected areas and the template summary,
+both deterministic for a dataset and query, so its rewrite can be reused.
+Lookups go through a bounded in-process LRU first and then the
+``SummaryRewrite`` table, which survives restarts and is shared by every
+worker. Entries expire after ``ANALYZER_LLM_CACHE_TTL`` seconds.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+
+def prompt_key(model: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[int] = None):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "writes": 0, "errors": 0}
+
+    @property
+    def ttl(self) -> int:
+        return self._ttl if self._ttl is not None else settings.ANALYZER_LLM_CACHE_TTL
+
+    @property
+    def max_entries(self) -> int:
+        return self._max_entries if self._max_entries is not None else settings.ANALYZER_LLM_CACHE_SIZE
+
+    def _remember(self, key: str, summary: str, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (summary, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.time():
+                    self._entries.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return entry[0]
+                del self._entries[key]
+
+        from .models import SummaryRewrite
+
+        try:
+            row = SummaryRewrite.objects.filter(
+                key=key, created_at__gte=timezone.now() - timedelta(seconds=self.ttl)
+            ).first()
+        except Exception as e:
+            print("LLM CACHE ERROR:", e)
+            self._count("errors")
+            row = None
+
+        if row is None:
+            self._count("misses")
+            return None
+        self._remember(key, row.summary, row.created_at.timestamp() + self.ttl)
+        self._count("db_hits")
+        return row.summary
+
+    def set(self, key: str, model: str, summary: str) -> None:
+        from .models import SummaryRewrite
+
+        now = timezone.now()
+        self._remember(key, summary, now.timestamp() + self.ttl)
+        try:
+            SummaryRewrite.objects.update_or_create(
+                key=key, defaults={"model": model, "summary": summary, "created_at": now}
+            )
+            SummaryRewrite.objects.filter(created_at__lt=now - timedelta(seconds=self.ttl)).delete()
+        except Exception as e:
+            print("LLM CACHE ERROR:", e)
+            self._count("errors")
+            return
+        self._count("writes")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+        lookups = counters["memory_hits"] + counters["db_hits"] + counters["misses"]
+        hits = counters["memory_hits"] + counters["db_hits"]
+        return dict(
+            counters,
+            entries=entries,
+            hit_rate=round(hits / lookups, 4) if lookups else None,
+        )
+
+
+summary_cache = SummaryCache()
@@ -0,0 +1,67 @@
+import time
+import tracemalloc
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from analyzer.dataset_cache import read_dataset
+from analyzer.exporters import EXPORT_FORMATS, ExportError, export_response
+
+
+def _export_size(df, fmt: str) -> int:
+    """Produce the whole download of ``df`` in ``fmt``; returns its size in bytes."""
+    response = export_response(df, fmt)
+    try:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    finally:
+        response.close()
+
+
+class Command(BaseCommand):
+    help = "Time every export format on the bundled dataset scaled up, with peak Python memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "source",
+            nargs="?",
+            help="Workbook to export (defaults to ANALYZER_DATASET_PATH).",
+        )
+        parser.add_argument("--rows", type=int, default=200_000, help="Rows to export.")
+        parser.add_argument(
+            "--formats",
+            default=",".join(EXPORT_FORMATS),
+            help="Comma-separated formats to time (default: all).",
+        )
+
+    def handle(self, *args, **options):
+        source = options["source"] or settings.ANALYZER_DATASET_PATH
+        try:
+            df, _ = read_dataset(source)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read {source}: {e}")
+        if not len(df):
+            raise CommandError(f"{source} has no data rows.")
+        # Repeat the rows, as a result of that many rows would be exported.
+        df = df.take(np.arange(options["rows"]) % len(df)).reset_index(drop=True)
+        self.stdout.write(f"{len(df)} rows x {len(df.columns)} columns")
+
+        for fmt in [f.strip() for f in options["formats"].split(",") if f.strip()]:
+            try:
+                started = time.perf_counter()
+                size = _export_size(df, fmt)
+                elapsed = time.perf_counter() - started
+                # Traced separately: tracemalloc slows the export down several times.
+                tracemalloc.start()
+                try:
+                    _export_size(df, fmt)
+                    _, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+            except ExportError as e:
+                self.stdout.write(f"{fmt:<8} skipped: {e}")
+                continue
+            self.stdout.write(
+                f"{fmt:<8} {elapsed:8.2f} s  {size / 1e6:8.1f} MB  "
+                f"{len(df) / elapsed:10,.0f} rows/s  peak {peak / 1e6:6.1f} MB"
+            )
@@ -0,0 +1,98 @@
+import os
+import re
+import tempfile
+import time
+import zipfile
+
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from analyzer.xlsx_reader import read_xlsx
+
+
+ROW_RE = re.compile(r"<row\b.*?</row>", re.S)
+REF_RE = re.compile(r'(<(?:row|c) r="[A-Z]*)\d+"')
+
+
+def scale_workbook(source: str, dest: str, rows: int) -> None:
+    """
+    Write a copy of ``source`` whose first sheet repeats its data rows
+    until there are ``rows`` of them, keeping the original cell markup.
+    """
+    with zipfile.ZipFile(source) as zin:
+        sheet = next(n for n in zin.namelist() if n.startswith("xl/worksheets/sheet"))
+        xml = zin.read(sheet).decode("utf-8")
+        start = xml.index("<sheetData>") + len("<sheetData>")
+        end = xml.index("</sheetData>")
+        found = ROW_RE.findall(xml, start, end)
+        if len(found) < 2:
+            raise ValueError("the sheet needs a header row and at least one data row")
+        header = found[0]
+        # Each template is split where the row number goes.
+        templates = [REF_RE.sub('\\1\0"', row).split("\0") for row in found[1:]]
+
+        with zipfile.ZipFile(dest, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zout:
+            for info in zin.infolist():
+                if info.filename != sheet:
+                    zout.writestr(info, zin.read(info.filename))
+                    continue
+                with zout.open(sheet, "w", force_zip64=True) as out:
+                    out.write((xml[:start] + header).encode("utf-8"))
+                    for first in range(0, rows, 10000):
+                        out.write("".join(
+                            str(i + 2).join(templates[i % len(templates)])
+                            for i in range(first, min(first + 10000, rows))
+                        ).encode("utf-8"))
+                    out.write(xml[end:].encode("utf-8"))
+
+
+class Command(BaseCommand):
+    help = "Compare analyzer.xlsx_reader with pandas/openpyxl on a scaled-up workbook."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "source",
+            nargs="?",
+            help="Workbook to scale (defaults to ANALYZER_DATASET_PATH).",
+        )
+        parser.add_argument("--rows", type=int, default=1_000_000, help="Data rows to generate.")
+        parser.add_argument("--keep", help="Write the scaled workbook here and keep it.")
+        parser.add_argument(
+            "--skip-openpyxl",
+            action="store_true",
+            help="Only time the fast reader (openpyxl takes minutes at 1M rows).",
+        )
+
+    def handle(self, *args, **options):
+        source = options["source"] or settings.ANALYZER_DATASET_PATH
+        with tempfile.TemporaryDirectory() as tmp:
+            dest = options["keep"] or os.path.join(tmp, "scaled.xlsx")
+            try:
+                scale_workbook(source, dest, options["rows"])
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Could not scale workbook: {e}")
+            size = os.path.getsize(dest)
+
+            started = time.perf_counter()
+            fast = read_xlsx(dest)
+            fast_time = time.perf_counter() - started
+            self.stdout.write(
+                f"{len(fast)} rows x {len(fast.columns)} columns, {size / 1e6:.1f} MB on disk"
+            )
+            self.stdout.write(f"xlsx_reader   {fast_time:8.2f} s")
+            if options["skip_openpyxl"]:
+                return
+
+            started = time.perf_counter()
+            slow = pd.read_excel(dest, engine="openpyxl")
+            slow_time = time.perf_counter() - started
+            self.stdout.write(f"read_excel    {slow_time:8.2f} s")
+
+        try:
+            pd.testing.assert_frame_equal(fast, slow, check_exact=True)
+        except AssertionError as e:
+            raise CommandError(f"Frames differ: {e}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Identical frames; xlsx_reader is {slow_time / fast_time:.1f}x faster."
+        ))
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.10 on 2026-10-18 01:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SummaryRewrite',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('model', models.CharField(max_length=64)),
+                ('summary', models.TextField()),
+                ('created_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -1,3 +1,24 @@
 from django.db import models
 
-# Create your models here.
+
+class SummaryRewrite(models.Model):
+    """LLM rewrite of a template summary, keyed by the hash of its prompt."""
+
+    key = models.CharField(max_length=64, primary_key=True)
+    model = models.CharField(max_length=64)
+    summary = models.TextField()
+    created_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.model}:{self.key[:12]}"
+
+
+class AnalysisResult(models.Model):
+    """Filter spec behind an /api/analyze/ response, exportable by its ID."""
+
+    result_id = models.CharField(max_length=20, primary_key=True)
+    spec = models.JSONField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.result_id
@@ -0,0 +1,112 @@
+"""
+One-time type normalization applied when a workbook is loaded.
+
+After loading, every dataset has:
+
+* a compact nullable integer year column (years that cannot be parsed,
+  e.g. "2020-21", become NA and are recorded in the report; their rows are
+  kept, only the per-year aggregates skip them),
+* numeric dtypes for the price/demand metrics (other text columns, such as
+  IDs and codes, are left as they are),
+* a categorical area column, so area lookups work on integer codes,
+
+so nothing on the request path has to parse strings.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .schema import schema_for
+
+
+class NormalizationReport:
+    """What normalization had to reject or coerce, kept alongside the dataset."""
+
+    def __init__(
+        self,
+        rejected_rows: Optional[List[int]] = None,
+        rejected_values: Optional[List[str]] = None,
+        coerced: Optional[Dict[str, int]] = None,
+    ):
+        # Sheet row numbers (header is row 1) and the year values that did not
+        # parse; those rows stay in the dataset with an NA year.
+        self.rejected_rows = rejected_rows or []
+        self.rejected_values = rejected_values or []
+        # Metric cells that were not numeric and became NaN, per column.
+        self.coerced = coerced or {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rejected_rows": self.rejected_rows,
+            "rejected_values": self.rejected_values,
+            "coerced": self.coerced,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "NormalizationReport":
+        data = data or {}
+        return cls(data.get("rejected_rows"), data.get("rejected_values"), data.get("coerced"))
+
+
+def _parse_years(series: pd.Series) -> pd.Series:
+    """Float years (NaN where unparseable) using the old int(float(str(x).strip())) rules."""
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return pd.Series(series.to_numpy(dtype=float, na_value=np.nan), index=series.index)
+    if series.dtype.kind == "f":
+        return series
+    return pd.to_numeric(series.astype(str).str.strip(), errors="coerce")
+
+
+def _compact_int(values: np.ndarray, mask: np.ndarray) -> pd.arrays.IntegerArray:
+    """Nullable integer array of ``values`` (NA where ``mask``) in the smallest dtype."""
+    present = values[~mask]
+    for dtype in (np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if present.size == 0 or (present.min() >= info.min and present.max() <= info.max):
+            return pd.arrays.IntegerArray(np.where(mask, 0, values).astype(dtype), mask)
+    return pd.arrays.IntegerArray(np.where(mask, 0, values).astype(np.int64), mask)
+
+
+def year_values(series: pd.Series) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """(int64 years, valid mask) of an integer year column, or None for other dtypes."""
+    if not pd.api.types.is_integer_dtype(series.dtype):
+        return None
+    return series.to_numpy(dtype=np.int64, na_value=0), series.notna().to_numpy()
+
+
+def normalize_frame(df: pd.DataFrame) -> Tuple[pd.DataFrame, NormalizationReport]:
+    df = df.copy()
+    df.columns = [str(c).strip() for c in df.columns]
+    report = NormalizationReport()
+
+    schema = schema_for(df)
+    year_col = schema.year
+    if year_col is not None:
+        years = _parse_years(df[year_col]).to_numpy(dtype=float)
+        bad = ~np.isfinite(years)
+        if bad.any():
+            positions = np.flatnonzero(bad)
+            report.rejected_rows = [int(p) + 2 for p in positions]
+            report.rejected_values = [str(v) for v in df[year_col].iloc[positions]]
+        whole = np.trunc(np.where(bad, 0, years)).astype(np.int64)
+        df[year_col] = _compact_int(whole, bad)
+
+    metric_cols = set(schema.metric_columns) - {year_col}
+
+    area_col = schema.area
+    # Other text columns (IDs, codes) keep their text: "0012" must not become 12.
+    for col in df.columns:
+        if col not in metric_cols or col == area_col or df[col].dtype != object:
+            continue
+        numeric = pd.to_numeric(df[col], errors="coerce")
+        lost = int(numeric.isna().sum() - df[col].isna().sum())
+        df[col] = numeric
+        if lost:
+            report.coerced[col] = lost
+
+    if area_col is not None and area_col != year_col:
+        df[area_col] = df[area_col].astype("category")
+
+    return df, report
@@ -0,0 +1,66 @@
+"""
+Column pruning and row filtering for reads of large uploads.
+
+When a query names areas, ``analysis_selection`` builds the ``Selection``
+that ``read_xlsx`` applies while it streams the sheet: once the header row
+is read, the schema is resolved from it, and only rows whose area could be
+one the query names are kept. With ``fields`` requested, only the columns
+the analysis and the table use are decoded.
+
+A row is kept when its area, split into words like ``AreaMatcher`` does,
+is a run of consecutive query words; those are exactly the names the
+matcher can find in the query, so area detection, the per-area aggregates
+and the table come out as on the full sheet. Rankings look at every area
+and read the whole sheet.
+"""
+
+from typing import Any, Callable, List, Optional, Set, Tuple
+
+from .area_matcher import tokenize
+from .intents import needs_every_area
+from .schema import resolve_schema
+from .table import TableQuery
+from .xlsx_reader import Selection
+
+
+def _word_runs(tokens: List[str]) -> Set[Tuple[str, ...]]:
+    return {
+        tuple(tokens[i:j]) for i in range(len(tokens)) for j in range(i + 1, len(tokens) + 1)
+    }
+
+
+def analysis_selection(
+    query: str, table_query: TableQuery
+) -> Optional[Callable[[List[Any]], Optional[Selection]]]:
+    """``select`` callback for ``read_xlsx``, or None when the whole sheet is needed."""
+    tokens = tokenize(query)
+    if not tokens or needs_every_area(query):
+        return None
+    runs = _word_runs(tokens)
+
+    def select(names: List[Any]) -> Optional[Selection]:
+        labels = [str(n).strip() for n in names]
+        schema = resolve_schema(tuple(labels))
+        if schema.area is None:
+            return None  # no rows to filter on
+
+        columns = None
+        if table_query.fields:
+            wanted = {schema.area, schema.year, schema.price, schema.demand}
+            wanted.update(table_query.fields)
+            wanted.update(s.lstrip("-") for s in table_query.sort)
+            columns = [n for n, label in zip(names, labels) if label in wanted]
+
+        seen = {}
+
+        def keep_row(value: Any) -> bool:
+            if not isinstance(value, str):
+                return False
+            kept = seen.get(value)
+            if kept is None:
+                kept = seen[value] = tuple(tokenize(value)) in runs
+            return kept
+
+        return Selection(columns, names[labels.index(schema.area)], keep_row)
+
+    return select
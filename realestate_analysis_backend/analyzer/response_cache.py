@@ -0,0 +1,77 @@
+"""
+Full-response cache for ``/api/analyze/`` on the bundled dataset.
+
+For the bundled dataset the response is a function of the dataset version,
+the query as the area matcher reads it (lowercased words) and the table
+parameters. Encoded bodies are stored under that key in Django's cache
+together with a strong ETag, so repeat requests skip all pandas work and
+conditional GETs can be answered with ``304 Not Modified``.
+"""
+
+import hashlib
+import json
+import threading
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .area_matcher import tokenize
+from .table import TableQuery
+
+
+RESPONSE_KEY_PREFIX = "analyzer:response:"
+
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "stores": 0, "not_modified": 0}
+
+
+def canonical_query(query: str) -> str:
+    return " ".join(tokenize(query))
+
+
+def response_key(version: str, query: str, table_query: TableQuery) -> str:
+    params = {
+        "version": version,
+        "query": canonical_query(query),
+        "limit": table_query.limit,
+        "offset": table_query.offset,
+        "sort": table_query.sort,
+        "fields": table_query.fields,
+    }
+    encoded = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return RESPONSE_KEY_PREFIX + hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def make_etag(body: bytes) -> str:
+    return '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+
+
+def count_response(name: str) -> None:
+    with _lock:
+        _counters[name] += 1
+
+
+def get_response(key: str) -> Optional[Dict[str, Any]]:
+    """Cached ``{"body", "etag", "spec"}`` for ``key``, if any."""
+    if settings.ANALYZER_RESPONSE_CACHE_TTL <= 0:
+        return None
+    entry = cache.get(key)
+    count_response("hits" if entry is not None else "misses")
+    return entry
+
+
+def store_response(key: str, body: bytes, etag: str, spec: Dict[str, Any]) -> None:
+    if settings.ANALYZER_RESPONSE_CACHE_TTL <= 0:
+        return
+    cache.set(
+        key,
+        {"body": body, "etag": etag, "spec": spec},
+        timeout=settings.ANALYZER_RESPONSE_CACHE_TTL,
+    )
+    count_response("stores")
+
+
+def response_cache_stats() -> Dict[str, int]:
+    with _lock:
+        return dict(_counters)
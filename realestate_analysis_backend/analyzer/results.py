@@ -0,0 +1,131 @@
+"""
+Server-side analysis results that can be exported later by ID.
+
+``AnalyzeAPIView`` stores the filter spec behind each response (dataset
+source and version, detected areas, sort and fields) under a short ID with
+a TTL. ``GET /api/download-xlsx/<id>/`` rebuilds the full filtered frame
+from that spec, so the client no longer has to post the rows back and
+exports are not capped at one page.
+
+Specs are kept in the ``AnalysisResult`` table, shared by every worker, so
+the download may reach another worker than the analysis. Django's cache
+sits in front of it: a worker rewrites a spec (refreshing its expiry) at
+most once per half TTL.
+"""
+
+import hashlib
+import json
+import os
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .area_index import AreaIndex
+from .dataset_cache import Dataset, dataset_cache
+from .schema import schema_for
+from .table import TableQuery
+from .uploads import load_upload
+
+
+RESULT_KEY_PREFIX = "analyzer:result:"
+
+
+def make_spec(
+    source_kind: str,
+    path: str,
+    version: Optional[str],
+    areas: List[str],
+    table_query: TableQuery,
+) -> Dict[str, Any]:
+    return {
+        "source": {"kind": source_kind, "path": path, "version": version},
+        "areas": list(areas),
+        "sort": table_query.sort,
+        "fields": table_query.fields,
+    }
+
+
+def save_result(spec: Dict[str, Any]) -> str:
+    """Store ``spec`` and return its ID; identical specs share one ID."""
+    encoded = json.dumps(spec, sort_keys=True, ensure_ascii=False)
+    result_id = hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:20]
+    key = RESULT_KEY_PREFIX + result_id
+    if cache.get(key) is not None:
+        return result_id  # stored lately, still more than half its TTL to live
+
+    from .models import AnalysisResult
+
+    ttl = settings.ANALYZER_RESULT_TTL
+    now = timezone.now()
+    try:
+        AnalysisResult.objects.update_or_create(
+            result_id=result_id, defaults={"spec": spec, "expires_at": now + timedelta(seconds=ttl)}
+        )
+        AnalysisResult.objects.filter(expires_at__lte=now).delete()
+    except Exception as e:
+        # Without the table (migrate not run), IDs only work in this worker.
+        print("RESULT STORE ERROR:", e)
+        cache.set(key, spec, timeout=ttl)
+        return result_id
+    cache.set(key, spec, timeout=ttl // 2)
+    return result_id
+
+
+def load_result(result_id: str) -> Optional[Dict[str, Any]]:
+    key = RESULT_KEY_PREFIX + result_id
+    spec = cache.get(key)
+    if spec is not None:
+        return spec
+
+    from .models import AnalysisResult
+
+    try:
+        row = AnalysisResult.objects.filter(
+            result_id=result_id, expires_at__gt=timezone.now()
+        ).first()
+    except Exception as e:
+        print("RESULT STORE ERROR:", e)
+        return None
+    if row is None:
+        return None
+    remaining = (row.expires_at - timezone.now()).total_seconds()
+    cache.set(key, row.spec, timeout=max(int(remaining) // 2, 1))
+    return row.spec
+
+
+def _load_source(source: Dict[str, Any]) -> Optional[Dataset]:
+    """The dataset a spec was computed on, or None if it changed or disappeared."""
+    path = source["path"]
+    if source["kind"] == "upload":
+        # Uploads are content-addressed: still parsed in memory, or retained on disk.
+        return load_upload(source["version"])
+
+    if not os.path.exists(path):
+        return None
+    dataset = dataset_cache.get(path)
+    return dataset if dataset.version == source["version"] else None
+
+
+def result_frame(spec: Dict[str, Any]) -> Optional[pd.DataFrame]:
+    """Every row of a stored result, sorted and projected as requested."""
+    dataset = _load_source(spec["source"])
+    if dataset is None:
+        return None
+
+    df = dataset.df
+    table_query = TableQuery({"sort": spec["sort"], "fields": spec["fields"]})
+    table_query.validate(df)
+
+    positions = None
+    if spec["areas"]:
+        schema = schema_for(df)
+        area_index = dataset.derive(
+            "area_index", lambda: AreaIndex(df, schema.area, schema.year)
+        )
+        positions = area_index.rows_for(spec["areas"])
+
+    return table_query.project(df, table_query.ordered(df, positions))
@@ -0,0 +1,83 @@
+"""
+Column role resolution for uploaded and bundled workbooks.
+
+Sheets name their columns inconsistently, so each role (area, year, price,
+demand, ...) is found by matching a list of candidate substrings against
+the header. ``schema_for`` resolves every role once and memoizes the
+result by the header itself, so repeated uploads of the same layout skip
+resolution entirely.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+
+AREA_COLUMN_KEYWORDS = ["area", "local", "location"]
+YEAR_CANDIDATES = ["year"]
+PRICE_CANDIDATES = [
+    "flat - weighted average rate", "weighted average rate", "avg price", "price"
+]
+DEMAND_CANDIDATES = ["total sold - igr", "total sold", "total_sales - igr"]
+CITY_CANDIDATES = ["city"]
+# Bare "lat"/"lon" would also match "flat ..." and "location".
+LAT_CANDIDATES = ["loc_lat", "latitude"]
+LNG_CANDIDATES = ["loc_lng", "longitude", "lng"]
+SUPPLY_CANDIDATES = ["total units", "units supplied", "supply"]
+
+_TYPE_RATE_RE = re.compile(r"^(.+?)\s*-\s*weighted average rate$", re.IGNORECASE)
+
+
+def _match(columns: Iterable[str], candidates: List[str]) -> Optional[str]:
+    """Return the first column matching a candidate, trying candidates in order."""
+    cols = list(columns)
+    for cand in candidates:
+        for c in cols:
+            if cand.lower() in c.lower():
+                return c
+    return None
+
+
+class DatasetSchema:
+    """Resolved column name for each role, or None when the sheet lacks it."""
+
+    def __init__(self, columns: Tuple[str, ...]):
+        self.columns = columns
+        self.area = next(
+            (c for c in columns if any(k in c.lower() for k in AREA_COLUMN_KEYWORDS)), None
+        )
+        self.year = _match(columns, YEAR_CANDIDATES)
+        self.price = _match(columns, PRICE_CANDIDATES)
+        self.demand = _match(columns, DEMAND_CANDIDATES)
+        self.city = _match(columns, CITY_CANDIDATES)
+        self.lat = _match(columns, LAT_CANDIDATES)
+        self.lng = _match(columns, LNG_CANDIDATES)
+        self.supply = _match(columns, SUPPLY_CANDIDATES)
+
+        # Per property type weighted rates, e.g. {"flat": "flat - weighted average rate"}.
+        self.rates: Dict[str, str] = {}
+        for c in columns:
+            m = _TYPE_RATE_RE.match(c.strip())
+            if m:
+                self.rates.setdefault(m.group(1).strip().lower(), c)
+
+    @property
+    def metric_columns(self) -> List[str]:
+        return [c for c in (self.price, self.demand) if c is not None]
+
+
+@lru_cache(maxsize=256)
+def resolve_schema(columns: Tuple[str, ...]) -> DatasetSchema:
+    return DatasetSchema(columns)
+
+
+def schema_for(df: pd.DataFrame) -> DatasetSchema:
+    """Schema for ``df``'s header, shared by every frame with the same columns."""
+    return resolve_schema(tuple(str(c) for c in df.columns))
+
+
+def schema_cache_stats() -> Dict[str, int]:
+    info = resolve_schema.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "entries": info.currsize}
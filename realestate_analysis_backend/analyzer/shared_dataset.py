@@ -0,0 +1,125 @@
+"""
+Dataset snapshots shared by every worker process on a host.
+
+The normalized dataset is published once as a columnar snapshot under
+``ANALYZER_SHARED_DATASET_DIR`` (``/dev/shm`` when available). Workers
+attach to it with read-only memory maps, so the numeric columns live in
+the page cache once instead of once per gunicorn worker.
+
+Layout::
+
+    <shared dir>/<name>/<version>/   one snapshot per dataset version
+    <shared dir>/<name>/CURRENT      name of the version to attach to
+
+``CURRENT`` is replaced with ``os.replace``, so a new version is swapped in
+atomically; workers that already mapped the old one keep a valid view
+until they reload.
+"""
+
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+import pandas as pd
+from django.conf import settings
+
+from . import snapshot
+from .normalize import NormalizationReport
+
+
+CURRENT_FILE = "CURRENT"
+KEEP_VERSIONS = 2
+
+
+def shared_root() -> Optional[str]:
+    """Directory holding shared snapshots, or None when sharing is disabled."""
+    root = getattr(settings, "ANALYZER_SHARED_DATASET_DIR", None)
+    return root or None
+
+
+def dataset_name(source_path: str) -> str:
+    return os.path.splitext(os.path.basename(source_path))[0]
+
+
+def current_dir(name: str) -> Optional[str]:
+    """Snapshot directory of the currently published version of ``name``."""
+    root = shared_root()
+    if root is None:
+        return None
+    try:
+        with open(os.path.join(root, name, CURRENT_FILE), encoding="utf-8") as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+    return os.path.join(root, name, version) if version else None
+
+
+def attach(source_path: str) -> Optional[str]:
+    """Snapshot directory of the published version of ``source_path``, if it matches the file."""
+    snapshot_dir = current_dir(dataset_name(source_path))
+    if snapshot_dir is None:
+        return None
+    try:
+        return snapshot_dir if snapshot.is_fresh(snapshot_dir, source_path) else None
+    except (OSError, ValueError):
+        return None
+
+
+def publish(
+    source_path: str, df: pd.DataFrame, report: Optional[NormalizationReport] = None
+) -> Optional[str]:
+    """
+    Publish ``df`` (parsed from ``source_path``) as the current shared version.
+
+    Safe to call from several workers at once: each version directory is
+    written once and ``CURRENT`` is swapped atomically.
+    """
+    root = shared_root()
+    if root is None:
+        return None
+
+    info = snapshot.source_info(source_path)
+    version = f"v{snapshot.SNAPSHOT_FORMAT}-{info['sha256'][:16]}"
+    name_dir = os.path.join(root, dataset_name(source_path))
+    os.makedirs(name_dir, exist_ok=True)
+
+    version_dir = os.path.join(name_dir, version)
+    if snapshot.read_meta(version_dir) is None:
+        extra = {"normalization": report.to_dict()} if report is not None else None
+        snapshot.write_snapshot(df, version_dir, source=info, overwrite=False, extra=extra)
+
+    fd, tmp = tempfile.mkstemp(dir=name_dir, prefix=".current-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(name_dir, CURRENT_FILE))
+
+    _prune(name_dir, version)
+    return version_dir
+
+
+def _prune(name_dir: str, current: str) -> None:
+    """Drop old versions; processes still mapping them keep their pages."""
+    versions = []
+    for entry in os.scandir(name_dir):
+        if entry.is_dir() and not entry.name.startswith(".") and ".tmp-" not in entry.name:
+            versions.append((entry.stat().st_mtime_ns, entry.name))
+    versions.sort(reverse=True)
+
+    kept = 0
+    for _, version in versions:
+        if version == current:
+            continue
+        kept += 1
+        if kept >= KEEP_VERSIONS:
+            shutil.rmtree(os.path.join(name_dir, version), ignore_errors=True)
+
+
+def publish_bundled_dataset() -> None:
+    """Load the bundled dataset at startup so it is published before the first request."""
+    from .dataset_cache import dataset_cache
+
+    try:
+        dataset_cache.get(settings.ANALYZER_DATASET_PATH)
+    except Exception as e:
+        print("SHARED DATASET ERROR:", e)
@@ -0,0 +1,108 @@
+"""
+Server-side paging, sorting and column projection for ``table_data``.
+
+Only the positions of the rows in scope are carried around; sorting looks
+at the sort columns alone, and the frame is materialized for just the
+requested page and fields.
+"""
+
+import json
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_LIMIT = 200
+MAX_LIMIT = 10000
+
+
+def _as_list(value: Any) -> List[str]:
+    """Accept ["a", "b"], "a,b" or a JSON-encoded list (multipart form fields)."""
+    if value in (None, ""):
+        return []
+    if isinstance(value, str):
+        text = value.strip()
+        if text.startswith("["):
+            try:
+                value = json.loads(text)
+            except ValueError:
+                raise ValueError(f"Invalid list: {value!r}")
+        else:
+            value = text.split(",")
+    if not isinstance(value, (list, tuple)):
+        raise ValueError(f"Invalid list: {value!r}")
+    return [str(v).strip() for v in value if str(v).strip()]
+
+
+def _as_int(value: Any, name: str, default: int, minimum: int, maximum: Optional[int] = None) -> int:
+    if value in (None, ""):
+        return default
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be an integer.")
+    if number < minimum or (maximum is not None and number > maximum):
+        upper = f" and {maximum}" if maximum is not None else ""
+        raise ValueError(f"'{name}' must be between {minimum}{upper}.")
+    return number
+
+
+class TableQuery:
+    """
+    Parsed ``limit``/``offset``/``sort``/``fields`` parameters.
+
+    ``sort`` is a list of column names, each optionally prefixed with "-"
+    for descending order. Raises ValueError on malformed values.
+    """
+
+    def __init__(self, data):
+        self.limit = _as_int(data.get("limit"), "limit", DEFAULT_LIMIT, 1, MAX_LIMIT)
+        self.offset = _as_int(data.get("offset"), "offset", 0, 0)
+        self.sort = _as_list(data.get("sort"))
+        self.fields = _as_list(data.get("fields"))
+
+    def validate(self, df: pd.DataFrame) -> None:
+        columns = set(map(str, df.columns))
+        unknown = [c for c in self.fields + [s.lstrip("-") for s in self.sort] if c not in columns]
+        if unknown:
+            raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+
+    def ordered(self, df: pd.DataFrame, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """Row positions in scope, in the requested sort order; call ``validate`` first."""
+        if positions is None:
+            positions = np.arange(len(df))
+        if not self.sort:
+            return positions
+
+        names = [s.lstrip("-") for s in self.sort]
+        keys = df[names].take(positions).reset_index(drop=True)
+        ordered = keys.sort_values(
+            names,
+            ascending=[not s.startswith("-") for s in self.sort],
+            kind="stable",
+            na_position="last",
+        ).index.to_numpy()
+        return positions[ordered]
+
+    def project(self, df: pd.DataFrame, positions: np.ndarray) -> pd.DataFrame:
+        """Materialize ``positions`` restricted to the requested fields."""
+        if self.fields:
+            col_idx = [df.columns.get_loc(c) for c in self.fields]
+            return df.iloc[positions, col_idx]
+        return df.take(positions)
+
+    def page(self, df: pd.DataFrame, positions: Optional[np.ndarray] = None) -> Tuple[pd.DataFrame, int]:
+        """Return (page frame, total rows in scope); call ``validate`` first."""
+        positions = self.ordered(df, positions)
+        page_positions = positions[self.offset:self.offset + self.limit]
+        return self.project(df, page_positions), len(positions)
+
+    def meta(self, total: int) -> dict:
+        end = self.offset + self.limit
+        return {
+            "total_rows": total,
+            "offset": self.offset,
+            "limit": self.limit,
+            "next_offset": end if end < total else None,
+        }
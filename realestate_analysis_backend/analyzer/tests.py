@@ -1,3 +1,963 @@
-from django.test import TestCase
+import datetime
+import decimal
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+import warnings
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import openpyxl
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from . import shared_dataset, snapshot, uploads
+from .aggregates import AggregateCube
+from .area_index import AreaIndex, area_key_codes
+from .area_matcher import AreaMatcher
+from .dataset_cache import Dataset, DatasetCache, _load_snapshot, load_dataset
+from .encoders import frame_records, json_chunks
+from .exporters import ExportError, export_response, iter_ndjson, write_parquet, write_xlsx
+from .intents import display_names, parse_intent, run_intent, top_k
+from .llm import CircuitBreaker, llm_stats, start_llm_summary
+from .llm_cache import summary_cache
+from .models import AnalysisResult
+from .normalize import normalize_frame
+from .response_cache import response_cache_stats
+from .results import load_result, save_result
+from .schema import resolve_schema, schema_for
+from .singleflight import SingleFlight, analysis_flight
+from .table import TableQuery
+from .views import AnalyzeAPIView
+from .xlsx_reader import Selection, XLSXReaderError, _read_first_sheet, read_xlsx
+
+
+class EncoderTests(SimpleTestCase):
+    def frame(self):
+        return pd.DataFrame({
+            "when": [datetime.time(1, 30), datetime.date(2024, 5, 1), "n/a"],
+            "at": [datetime.datetime(2024, 5, 1, 12), None, "later"],
+            "amount": [decimal.Decimal("1.5"), decimal.Decimal("NaN"), 3],
+            "n": [1.0, np.nan, np.inf],
+        })
+
+    def test_stream_encodes_dates_times_and_decimals(self):
+        body = b"".join(json_chunks({"summary": "s"}, "table_data", self.frame(), chunk_rows=2))
+        rows = json.loads(body)["table_data"]
+        self.assertEqual(rows[0], {"when": "01:30:00", "at": "2024-05-01T12:00:00", "amount": 1.5, "n": 1.0})
+        self.assertEqual(rows[1], {"when": "2024-05-01", "at": None, "amount": None, "n": None})
+        self.assertEqual(rows[2]["when"], "n/a")
+
+    def test_ndjson_encodes_dates_and_times(self):
+        lines = b"".join(iter_ndjson(self.frame())).decode("utf-8").splitlines()
+        self.assertEqual([json.loads(line)["when"] for line in lines], ["01:30:00", "2024-05-01", "n/a"])
+
+
+class XLSXExportTests(SimpleTestCase):
+    def test_datetime_columns_are_written_as_dates_without_warnings(self):
+        df = pd.DataFrame({
+            "when": pd.to_datetime(["2024-01-31 10:30", None]),
+            "utc": pd.to_datetime(["2024-02-01", "2024-02-02"]).tz_localize("UTC"),
+        })
+        out = io.BytesIO()
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            write_xlsx(df, out)
+        out.seek(0)
+        rows = list(openpyxl.load_workbook(out).active.values)
+        self.assertEqual(rows[1], (datetime.datetime(2024, 1, 31, 10, 30), datetime.datetime(2024, 2, 1)))
+        self.assertEqual(rows[2], (None, datetime.datetime(2024, 2, 2)))
+
+
+    def test_rows_beyond_the_sheet_limit_are_refused(self):
+        df = pd.DataFrame({"n": range(5)})
+        with mock.patch("analyzer.exporters.XLSX_MAX_ROWS", 5):
+            with self.assertRaises(ExportError):
+                write_xlsx(df, io.BytesIO())
+            write_xlsx(df.iloc[:4], io.BytesIO())  # header + 4 rows fit
+            with self.assertRaises(ExportError):
+                export_response(df, "xlsx")
+
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+@unittest.skipIf(pq is None, "pyarrow is not installed")
+class ParquetExportTests(SimpleTestCase):
+    def test_mixed_object_columns_are_written_as_text(self):
+        df = pd.DataFrame({
+            "rate": [1500, "n/a", 2.5, None] * 2000,
+            "year": np.arange(8000, dtype=np.int64),
+            "area": pd.Categorical(["Wakad", "Aundh"] * 4000),
+        })
+        out = io.BytesIO()
+        write_parquet(df, out)
+        out.seek(0)
+        table = pq.read_table(out)
+        self.assertEqual(str(table.schema.field("rate").type), "string")
+        self.assertEqual(table.column("rate").to_pylist()[:4], ["1500", "n/a", "2.5", None])
+        self.assertEqual(table.column("year").to_pylist(), list(range(8000)))
+
+
+class DatasetCacheTests(SimpleTestCase):
+    def test_parsed_once_per_file_version(self):
+        loads = []
+
+        def loader(path):
+            loads.append(path)
+            return normalize_frame(pd.read_csv(path))
+
+        cache = DatasetCache(loader)
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "data.csv")
+            with open(path, "w") as f:
+                f.write("final location,year\nWakad,2020\n")
+            first = cache.get(path)
+            self.assertIs(cache.get(path), first)
+            self.assertEqual((cache.hits, cache.misses, len(loads)), (1, 1, 1))
+
+            with open(path, "a") as f:
+                f.write("Aundh,2021\n")
+            second = cache.get(path)
+        self.assertEqual(len(second.df), 2)
+        self.assertNotEqual(second.version, first.version)
+        self.assertEqual((cache.misses, len(loads)), (2, 2))
+        self.assertEqual(cache.stats()["entries"], 1)
+        self.assertEqual(cache.stats()["datasets"][0]["name"], "data.csv")
+        self.assertNotIn(root, json.dumps(cache.stats()))
+
+    def test_derived_structures_are_built_once(self):
+        dataset = Dataset(pd.DataFrame({"a": [1]}), "v1")
+        builds = []
+        for _ in range(3):
+            dataset.derive("index", lambda: builds.append(1) or len(builds))
+        self.assertEqual(len(builds), 1)
+
+
+class SnapshotTests(SimpleTestCase):
+    def test_normalization_report_survives_round_trip(self):
+        df, report = normalize_frame(pd.DataFrame({
+            "final location": ["Wakad", "Aundh", "Akurdi"],
+            "year": [2020, "unknown", 2022],
+            "flat - weighted average rate": [1.5, 2.5, 3.5],
+        }))
+        self.assertEqual(report.rejected_rows, [3])
+
+        with tempfile.TemporaryDirectory() as root:
+            dest = os.path.join(root, "snap")
+            snapshot.write_snapshot(df, dest, extra={"normalization": report.to_dict()})
+            loaded, loaded_report = _load_snapshot(dest)
+            self.assertTrue(loaded.equals(df))  # columns come back memory-mapped
+            self.assertEqual(loaded["year"].isna().tolist(), [False, True, False])
+        self.assertEqual(loaded_report.to_dict(), report.to_dict())
+
+
+@override_settings(ANALYZER_SHARED_DATASET_DIR="")
+class SnapshotLoadingTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.path = os.path.join(root.name, "data.xlsx")
+        self.write(["Wakad", 2020, 1.5], ["Aundh", 2021, 2.5])
+
+    def write(self, *rows):
+        with open(self.path, "wb") as f:
+            f.write(workbook_bytes(["final location", "year", "rate"], *rows))
+
+    def test_fresh_snapshot_is_memory_mapped_instead_of_parsed(self):
+        call_command("build_snapshot", self.path, stdout=io.StringIO())
+        self.assertTrue(snapshot.is_fresh(snapshot.snapshot_path(self.path), self.path))
+
+        with mock.patch("analyzer.dataset_cache.read_dataset", side_effect=AssertionError("parsed")):
+            df, _ = load_dataset(self.path)
+        self.assertEqual(df["final location"].tolist(), ["Wakad", "Aundh"])
+        self.assertIsInstance(df["rate"].to_numpy().base, np.memmap)
+
+    def test_stale_snapshot_falls_back_to_the_workbook(self):
+        call_command("build_snapshot", self.path, stdout=io.StringIO())
+        self.write(["Wakad", 2020, 1.5], ["Aundh", 2021, 2.5], ["Baner", 2022, 3.5])
+        self.assertFalse(snapshot.is_fresh(snapshot.snapshot_path(self.path), self.path))
+
+        df, _ = load_dataset(self.path)
+        self.assertEqual(df["final location"].tolist(), ["Wakad", "Aundh", "Baner"])
+
+
+class SharedDatasetTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.path = os.path.join(root.name, "data.xlsx")
+        shared = override_settings(ANALYZER_SHARED_DATASET_DIR=os.path.join(root.name, "shm"))
+        shared.enable()
+        self.addCleanup(shared.disable)
+
+    def write(self, *rows):
+        with open(self.path, "wb") as f:
+            f.write(workbook_bytes(["final location", "year"], *rows))
+
+    def test_workers_attach_to_the_published_copy(self):
+        self.write(["Wakad", 2020])
+        self.assertIsNone(shared_dataset.attach(self.path))
+        df, _ = load_dataset(self.path)  # first worker parses and publishes
+        published = shared_dataset.attach(self.path)
+        self.assertIsNotNone(published)
+
+        with mock.patch("analyzer.dataset_cache.read_dataset", side_effect=AssertionError("parsed")):
+            again, _ = load_dataset(self.path)
+        self.assertTrue(again.equals(df))
+
+    def test_new_version_replaces_current_and_old_ones_are_pruned(self):
+        dirs = []
+        for i in range(4):
+            self.write(*[["Wakad", 2020 + j] for j in range(i + 1)])
+            load_dataset(self.path)
+            dirs.append(shared_dataset.attach(self.path))
+            self.assertEqual(len(load_dataset(self.path)[0]), i + 1)
+        self.assertEqual(len(set(dirs)), 4)
+        name_dir = os.path.dirname(dirs[-1])
+        kept = sorted(e for e in os.listdir(name_dir) if not e.startswith(".") and e != "CURRENT")
+        self.assertEqual(kept, sorted(os.path.basename(d) for d in dirs[-shared_dataset.KEEP_VERSIONS:]))
+
+
+class SchemaTests(SimpleTestCase):
+    def test_roles(self):
+        schema = resolve_schema((
+            "Final Location", "Year", "City", "loc_lat", "loc_lng", "total units",
+            "flat - weighted average rate", "office - weighted average rate", "total sold - igr",
+        ))
+        self.assertEqual(schema.area, "Final Location")
+        self.assertEqual(schema.year, "Year")
+        self.assertEqual(schema.price, "flat - weighted average rate")  # first candidate wins
+        self.assertEqual(schema.demand, "total sold - igr")
+        self.assertEqual((schema.lat, schema.lng, schema.supply), ("loc_lat", "loc_lng", "total units"))
+        self.assertEqual(set(schema.rates), {"flat", "office"})
+        self.assertEqual(schema.metric_columns, ["flat - weighted average rate", "total sold - igr"])
+
+        schema = resolve_schema(("locality", "price"))
+        self.assertEqual((schema.area, schema.price, schema.year, schema.demand), ("locality", "price", None, None))
+
+    def test_memoized_by_header(self):
+        first = schema_for(pd.DataFrame(columns=["area", "year", "price", "x1"]))
+        second = schema_for(pd.DataFrame({"area": [1], "year": [2], "price": [3], "x1": [4]}))
+        self.assertIs(first, second)
+        self.assertIsNot(schema_for(pd.DataFrame(columns=["area", "year"])), first)
+
+
+class NormalizeTests(SimpleTestCase):
+    def test_only_metric_columns_become_numeric(self):
+        df, report = normalize_frame(pd.DataFrame({
+            "final location": ["Wakad", "Aundh"],
+            "year": ["2020", "2021"],
+            "flat - weighted average rate": ["1500.5", "n/a"],
+            "pin code": ["0411057", "411057"],
+        }))
+        self.assertEqual(df["year"].tolist(), [2020, 2021])
+        self.assertEqual(df["flat - weighted average rate"].iloc[0], 1500.5)
+        self.assertTrue(np.isnan(df["flat - weighted average rate"].iloc[1]))
+        self.assertEqual(report.coerced, {"flat - weighted average rate": 1})
+        self.assertEqual(df["pin code"].tolist(), ["0411057", "411057"])
+
+    def test_rows_with_unparseable_years_are_kept(self):
+        df, report = normalize_frame(pd.DataFrame({
+            "final location": ["Wakad", "Wakad", "Wakad", "Aundh"],
+            "year": ["2021", "2020-21", "2020", None],
+            "flat - weighted average rate": [3.0, 100.0, 1.0, 5.0],
+        }))
+        self.assertEqual(len(df), 4)
+        self.assertEqual([r["year"] for r in frame_records(df)], [2021, None, 2020, None])
+        self.assertEqual(report.rejected_rows, [3, 5])
+        self.assertEqual(report.rejected_values, ["2020-21", "None"])
+
+        cube = AggregateCube(df, "final location", "year", ["flat - weighted average rate"])
+        self.assertEqual(cube.years_for("Wakad"), [2020, 2021])
+        self.assertEqual(cube.mean("flat - weighted average rate", "Wakad", 2021), 3.0)
+        self.assertEqual(cube.years_for("Aundh"), [])
+        index = AreaIndex(df, "final location", "year")
+        self.assertEqual(index.rows("Wakad").tolist(), [2, 0, 1])  # NA year last
+
+    def test_text_year_column_keeps_every_row(self):
+        df, report = normalize_frame(pd.DataFrame({
+            "final location": ["Wakad", "Aundh"],
+            "year built": ["new", "old"],
+        }))
+        self.assertEqual(df["final location"].tolist(), ["Wakad", "Aundh"])
+        self.assertEqual(len(report.rejected_rows), 2)
+
+
+class UploadPushdownTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        uploads.upload_cache.clear()
+        self.addCleanup(uploads.upload_cache.clear)
+        with open(settings.ANALYZER_DATASET_PATH, "rb") as f:
+            self.workbook = f.read()
+
+    def analyze(self):
+        upload = SimpleUploadedFile("sample.xlsx", self.workbook)
+        response = self.client.post("/api/analyze/", {"query": "Wakad", "file": upload})
+        self.assertEqual(response.status_code, 200)
+        payload = json.loads(b"".join(response.streaming_content))
+        payload.pop("result_id")
+        return payload
+
+    def test_reuploads_share_one_full_parse(self):
+        with override_settings(
+            MEDIA_ROOT=self.media.name, ANALYZER_RETAIN_UPLOADS=True, ANALYZER_UPLOAD_PUSHDOWN_BYTES=1
+        ):
+            before = uploads.upload_cache.stats()
+            first = self.analyze()
+            uploads._background.submit(lambda: None).result()  # wait for the full parse
+            second = self.analyze()
+            third = self.analyze()
+
+        stats = uploads.upload_cache.stats()
+        self.assertEqual(stats["partial_parses"] - before["partial_parses"], 1)
+        self.assertEqual(stats["parses"] - before["parses"], 1)
+        self.assertEqual(stats["entries"], 1)
+        self.assertEqual(first, second)
+        self.assertEqual(second, third)
+
+
+class SingleFlightTests(SimpleTestCase):
+    THREADS = 16
+
+    def run_together(self, flight, key, build):
+        start = threading.Barrier(self.THREADS)
+        results = [None] * self.THREADS
+
+        def call(i):
+            start.wait()
+            try:
+                results[i] = flight.do(key, build)
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(self.THREADS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def test_concurrent_callers_share_one_build(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.2)  # long enough for every caller to arrive
+            return {"body": object()}
+
+        before = analysis_flight.stats()
+        results = self.run_together(analysis_flight, "stress-test", build)
+        after = analysis_flight.stats()
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(r is results[0] for r in results))
+        self.assertEqual(after["leaders"] - before["leaders"], 1)
+        self.assertEqual(after["coalesced"] - before["coalesced"], self.THREADS - 1)
+        self.assertEqual(after["in_flight"], 0)
+
+    def test_error_reaches_every_caller_and_is_not_kept(self):
+        flight = SingleFlight()
+
+        def build():
+            time.sleep(0.2)
+            raise ValueError("boom")
+
+        results = self.run_together(flight, "key", build)
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(flight.do("key", lambda: 42), 42)
+
+
+class _StubLLM(BaseHTTPRequestHandler):
+    """Chat completions endpoint answering every prompt with a fixed rewrite."""
+
+    reply = "Rewritten summary."
+    requests = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        type(self).requests += 1
+        body = json.dumps({
+            "id": "stub", "object": "chat.completion", "created": 0, "model": "stub",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": self.reply}}],
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LLMStubServerTests(TransactionTestCase):
+    # The rewrite is stored from the LLM thread, outside the test transaction.
+    def setUp(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _StubLLM)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.base_url = f"http://127.0.0.1:{server.server_port}"
+        _StubLLM.requests = 0
+
+    def test_rewrite_comes_from_the_stub_and_is_cached(self):
+        summary = f"Analysis for Wakad at {time.time()}."  # a prompt no earlier test cached
+        with override_settings(GROK_BASE_URL=self.base_url), \
+                mock.patch.dict(os.environ, {"GROK_API_KEY": "test-key"}):
+            first = start_llm_summary(["Wakad"], summary, timeout=10)
+            self.assertEqual(first.result(), _StubLLM.reply)
+            self.assertTrue(first.final)
+            again = start_llm_summary(["Wakad"], summary, timeout=10)
+            self.assertEqual(again.result(), _StubLLM.reply)
+        self.assertEqual(_StubLLM.requests, 1)
+        self.assertGreaterEqual(llm_stats()["cached"], 1)
+
+
+class LLMOverlapTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        summary_cache.clear()
+        self.addCleanup(cache.clear)
+        self.addCleanup(summary_cache.clear)
+        env = mock.patch.dict(os.environ, {"GROK_API_KEY": "test-key"})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def analyze(self):
+        response = self.client.post("/api/analyze/", {"query": "Wakad"}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_chart_and_table_are_built_while_the_call_is_in_flight(self):
+        built = threading.Event()
+        page = TableQuery.page
+
+        def page_and_signal(self, *args):
+            out = page(self, *args)
+            built.set()
+            return out
+
+        def llm(api_key, prompt):
+            if not built.wait(5):
+                raise RuntimeError("the table was not built during the call")
+            return "Rewritten."
+
+        with mock.patch("analyzer.llm._call_llm", llm), \
+                mock.patch.object(TableQuery, "page", page_and_signal), \
+                override_settings(ANALYZER_LLM_TIMEOUT=5):
+            payload = self.analyze()
+        self.assertEqual(payload["summary"], "Rewritten.")
+        self.assertTrue(payload["chart_data"]["Wakad"])
+        self.assertTrue(payload["table_data"])
+
+    def test_late_rewrite_is_served_to_the_next_request(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def llm(api_key, prompt):
+            release.wait(5)
+            return "Rewritten late."
+
+        with mock.patch("analyzer.llm._call_llm", llm), override_settings(ANALYZER_LLM_TIMEOUT=0.05):
+            late = llm_stats()["late"]
+            self.assertTrue(self.analyze()["summary"].startswith("Analysis for Wakad"))
+            release.set()
+            deadline = time.monotonic() + 5
+            while llm_stats()["late"] == late and time.monotonic() < deadline:
+                time.sleep(0.01)  # counted once the rewrite is cached
+            # The template answer was not cached, so this request sees the rewrite.
+            self.assertEqual(self.analyze()["summary"], "Rewritten late.")
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_threshold_and_closes_after_a_good_trial(self):
+        breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+        breaker.record(False)
+        self.assertTrue(breaker.allow())
+        breaker.record(False)
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())   # the single trial call
+        self.assertFalse(breaker.allow())
+        breaker.record(True)
+        self.assertEqual(breaker.state, "closed")
+
+
+def workbook_bytes(*rows) -> bytes:
+    wb = openpyxl.Workbook()
+    for row in rows:
+        wb.active.append(row)
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def with_sheet_xml(sheet_xml: str) -> bytes:
+    source = zipfile.ZipFile(io.BytesIO(workbook_bytes(["x"])))
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w") as z:
+        for info in source.infolist():
+            data = sheet_xml if info.filename == "xl/worksheets/sheet1.xml" else source.read(info.filename)
+            z.writestr(info, data)
+    return out.getvalue()
+
+
+SHEET_NS = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+
+
+class XLSXReaderTests(SimpleTestCase):
+    def assertSameAsPandas(self, source, fast=True):
+        def open_source():
+            return io.BytesIO(source) if isinstance(source, bytes) else source
+
+        expected = pd.read_excel(open_source(), engine="openpyxl")
+        if fast:
+            got = _read_first_sheet(open_source())  # no silent fallback
+        else:
+            with self.assertRaises(XLSXReaderError):
+                _read_first_sheet(open_source())
+            got = read_xlsx(open_source())
+        pd.testing.assert_frame_equal(got, expected, check_exact=True)
+
+    def test_bundled_workbook(self):
+        self.assertSameAsPandas(settings.ANALYZER_DATASET_PATH)
+
+    def test_mixed_types_and_holes(self):
+        rows = [["name", "n", "x", "when", "flag", "mix", "name", None, 2020]]
+        for i in range(30):
+            rows.append([
+                f"a{i}", i, i / 3, datetime.datetime(2020, 1, 1) + datetime.timedelta(days=i),
+                i % 2 == 0, "s" if i % 5 == 0 else i, "dup", None, None if i % 3 else float(i),
+            ])
+        rows += [[], [None, 5], [], []]
+        self.assertSameAsPandas(workbook_bytes(*rows))
+
+    def test_rows_without_references(self):
+        self.assertSameAsPandas(with_sheet_xml(
+            f'<worksheet {SHEET_NS}><sheetData>'
+            '<row><c t="inlineStr"><is><t>h1</t></is></c><c t="inlineStr"><is><t>h2</t></is></c></row>'
+            '<row><c><v>1</v></c><c t="str"><v>x</v></c></row>'
+            '<row r="5"><c r="B5"><v>2</v></c><c><v>3</v></c></row>'
+            '<row r="4"><c><v>9</v></c></row>'
+            '</sheetData></worksheet>'
+        ))
+
+    def test_unsupported_sheets_fall_back_to_pandas(self):
+        self.assertSameAsPandas(workbook_bytes(["only", "header"]), fast=False)
+        self.assertSameAsPandas(workbook_bytes(["a", "b"], [1, 2 ** 60]), fast=False)
+        self.assertSameAsPandas(with_sheet_xml(
+            f'<worksheet {SHEET_NS}><sheetData>'
+            '<row r="1"><c r="B1" t="inlineStr"><is><t>h</t></is></c><c r="A1"><v>1</v></c></row>'
+            '<row r="2"><c r="A2"><v>1</v></c></row>'
+            '</sheetData></worksheet>'
+        ), fast=False)
+
+
+class UploadCacheTests(SimpleTestCase):
+    def dataset(self, rows: int) -> Dataset:
+        return Dataset(pd.DataFrame({"n": np.arange(rows, dtype=np.int64)}), version=None)
+
+    def test_least_recently_used_entries_are_evicted_over_budget(self):
+        one = uploads.frame_nbytes(self.dataset(100).df)
+        cache = uploads.UploadCache(max_bytes=2 * one, ttl=3600)
+        for sha in "abc":
+            cache.put(sha, self.dataset(100))
+            if sha == "b":
+                cache.get("a")  # now b is the least recently used
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_concurrent_misses_parse_once(self):
+        cache = uploads.UploadCache(max_bytes=1 << 30, ttl=3600)
+        upload = io.BytesIO(workbook_bytes(["area", "year"], ["Wakad", 2020]))
+        start = threading.Barrier(8)
+        results = []
+
+        def ingest():
+            start.wait()
+            results.append(cache.get_or_parse("sha", upload))
+
+        threads = [threading.Thread(target=ingest) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(cache.stats()["parses"], 1)
+        self.assertTrue(all(r is results[0] for r in results))
+
+
+class DatasetSessionTests(TestCase):
+    def setUp(self):
+        uploads.upload_cache.clear()
+        self.addCleanup(uploads.upload_cache.clear)
+        with open(settings.ANALYZER_DATASET_PATH, "rb") as f:
+            self.upload = SimpleUploadedFile("sample.xlsx", f.read())
+
+    def test_dataset_id_is_queryable_until_it_expires(self):
+        response = self.client.post("/api/datasets/", {"file": self.upload})
+        self.assertEqual(response.status_code, 201)
+        dataset_id = response.json()["dataset_id"]
+
+        response = self.client.get("/api/analyze/", {"query": "Wakad", "dataset_id": dataset_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["dataset_id"], dataset_id)
+        self.assertEqual(
+            self.client.get("/api/analyze/", {"dataset_id": "nope"}).status_code, 400
+        )
+
+        before = uploads.upload_cache.stats()["expirations"]
+        with override_settings(ANALYZER_UPLOAD_TTL=0, ANALYZER_RETAIN_UPLOADS=False):
+            time.sleep(0.01)
+            response = self.client.get("/api/analyze/", {"query": "Aundh", "dataset_id": dataset_id})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(uploads.upload_cache.stats()["expirations"] - before, 1)
+
+    def test_resident_ids_are_not_listed(self):
+        dataset_id = self.client.post("/api/datasets/", {"file": self.upload}).json()["dataset_id"]
+
+        for url in ("/api/datasets/", "/api/stats/"):
+            body = self.client.get(url).content.decode("utf-8")
+            self.assertNotIn(dataset_id, body)
+        self.assertEqual(self.client.get("/api/datasets/").json()["entries"], 1)
+
+        response = self.client.get("/api/datasets/", {"dataset_id": dataset_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["dataset_id"], dataset_id)
+        self.assertEqual(
+            self.client.get("/api/datasets/", {"dataset_id": "0" * 64}).status_code, 404
+        )
+
+
+class ResultStoreTests(TestCase):
+    spec = {"source": {"kind": "bundled", "path": "x.xlsx", "version": "v1"},
+            "areas": ["Wakad"], "sort": [], "fields": None}
+
+    def test_specs_are_shared_through_the_database(self):
+        result_id = save_result(self.spec)
+        cache.clear()  # another worker: nothing in its local cache
+        self.assertEqual(load_result(result_id), self.spec)
+        self.assertEqual(save_result(self.spec), result_id)
+        self.assertEqual(AnalysisResult.objects.count(), 1)
+
+    def test_expired_specs_are_not_loaded(self):
+        with override_settings(ANALYZER_RESULT_TTL=0):
+            result_id = save_result(self.spec)
+        cache.clear()
+        self.assertIsNone(load_result(result_id))
+
+    def test_download_from_a_worker_that_did_not_analyze(self):
+        response = self.client.get("/api/analyze/", {"query": "Wakad"})
+        result_id = json.loads(response.content)["result_id"]
+        cache.clear()
+        response = self.client.get(f"/api/download-xlsx/{result_id}/", {"format": "csv"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Wakad", b"".join(response.streaming_content))
+
+
+class AggregateCubeTests(SimpleTestCase):
+    def setUp(self):
+        self.df, _ = normalize_frame(pd.DataFrame({
+            "final location": ["Wakad", "wakad", "WAKAD", "Aundh", None, "Aundh"],
+            "year": [2020, 2020, 2021, 2021, 2020, 2022],
+            "flat - weighted average rate": [100.0, 200.0, np.nan, 300.0, 50.0, "n/a"],
+            "total sold - igr": [1, 2, 3, 4, 5, 6],
+        }))
+        self.metrics = {"price": "flat - weighted average rate", "demand": "total sold - igr"}
+        self.cube = AggregateCube(self.df, "final location", "year", self.metrics.values())
+
+    def expected(self, rows):
+        grouped = rows.groupby("year")[list(self.metrics.values())].mean()
+        return [
+            {"year": int(year), **{k: None if pd.isna(r[c]) else float(r[c]) for k, c in self.metrics.items()}}
+            for year, r in grouped.iterrows()
+        ]
+
+    def test_matches_per_area_groupby(self):
+        areas = self.df["final location"].astype(str).str.lower()
+        for area in ("Wakad", "aundh"):
+            self.assertEqual(
+                self.cube.series(area, self.metrics),
+                self.expected(self.df[areas == area.lower()]),
+            )
+        self.assertEqual(self.cube.dataset_series(self.metrics), self.expected(self.df))
+
+    def test_lookups(self):
+        self.assertTrue(self.cube.has_area("WAKAD"))
+        self.assertFalse(self.cube.has_area("Baner"))
+        self.assertEqual(self.cube.years_for("Aundh"), [2021, 2022])
+        self.assertEqual(self.cube.mean(self.metrics["price"], "wakad", 2020), 150.0)
+        self.assertIsNone(self.cube.mean(self.metrics["price"], "Wakad", 2021))  # NaN only
+        self.assertIsNone(self.cube.mean(self.metrics["price"], "Wakad", 1999))
+        self.assertEqual(self.cube.series("Baner", self.metrics), [])
+
+
+class AreaIndexTests(TestCase):
+    def test_case_insensitive_rows_ordered_by_year(self):
+        df = pd.DataFrame({
+            "area": pd.Categorical(["Wakad", "aundh", None, "WAKAD", "Aundh"]),
+            "year": np.array([2022, 2021, 2020, 2020, 2019], dtype=np.int64),
+        })
+        codes, keys = area_key_codes(df["area"])
+        self.assertEqual(sorted(keys), ["aundh", "wakad"])
+        self.assertEqual(codes[2], -1)
+        index = AreaIndex(df, "area", "year")
+        self.assertEqual(index.rows("wakad").tolist(), [3, 0])
+        self.assertEqual(index.rows_for(["Aundh", "Nowhere"]).tolist(), [4, 1])
+
+    def test_area_column_without_any_value(self):
+        df = pd.DataFrame({
+            "area": pd.Categorical([None, None]),
+            "year": np.array([2020, 2021], dtype=np.int64),
+            "rate": [1.0, 2.0],
+        })
+        codes, keys = area_key_codes(df["area"])
+        self.assertEqual((codes.tolist(), keys), ([-1, -1], []))
+        self.assertEqual(AreaIndex(df, "area", "year").rows("Wakad").tolist(), [])
+        cube = AggregateCube(df, "area", "year", ["rate"])
+        self.assertEqual(cube.years.tolist(), [2020, 2021])
+
+    def test_upload_with_blank_locations_is_analyzed(self):
+        upload = SimpleUploadedFile("blank.xlsx", workbook_bytes(
+            ["final location", "year", "flat - weighted average rate", "total sold - igr"],
+            [None, 2020, 5000, 10],
+            [None, 2021, 5500, 12],
+        ))
+        response = self.client.post("/api/analyze/", {"query": "Wakad", "file": upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("chart_data", json.loads(b"".join(response.streaming_content)))
+
+
+class IntentTests(SimpleTestCase):
+    PRICE, DEMAND = "flat - weighted average rate", "total sold - igr"
+
+    def setUp(self):
+        df, _ = normalize_frame(pd.DataFrame({
+            "final location": ["Wakad"] * 3 + ["Aundh"] * 3 + ["Baner"] * 3,
+            "year": [2020, 2021, 2022] * 3,
+            self.PRICE: [100, 110, 121, 200, 200, 150, 50, 75, 100],
+            self.DEMAND: [10, 20, 30, 5, 5, 5, 1, 2, 40],
+        }))
+        self.cube = AggregateCube(df, "final location", "year", [self.PRICE, self.DEMAND])
+        self.metrics = {"price": self.PRICE, "demand": self.DEMAND}
+        self.names = display_names(["Wakad", "Aundh", "Baner"])
+
+    def ask(self, query, areas=()):
+        intent = parse_intent(query, list(areas))
+        self.assertIsNotNone(intent)
+        return run_intent(intent, self.cube, self.metrics, self.names)
+
+    def test_ranking(self):
+        answer = self.ask("Which area has highest demand?")
+        self.assertEqual(answer.to_dict()["type"], "ranking")
+        self.assertEqual(answer.results, [{"area": "Baner", "value": 40.0, "year": 2022}])
+
+        answer = self.ask("top 2 cheapest areas")
+        self.assertEqual(answer.intent.k, 2)
+        self.assertFalse(answer.intent.descending)
+        self.assertEqual(answer.areas, ["Baner", "Wakad"])
+        self.assertEqual(self.ask("top 2 most expensive areas").areas, ["Aundh", "Wakad"])
+
+    def test_growth_ranking_over_n_years(self):
+        answer = self.ask("Which areas grew most in price over the last 2 years?")
+        self.assertEqual(answer.intent.kind, "growth_ranking")
+        self.assertEqual(answer.intent.years, 2)
+        self.assertEqual(answer.areas, ["Baner", "Wakad", "Aundh"])
+        self.assertAlmostEqual(answer.results[0]["growth_pct"], 100.0)
+        self.assertEqual((answer.results[0]["from_year"], answer.results[0]["to_year"]), (2020, 2022))
+
+    def test_growth_of_one_area(self):
+        answer = self.ask("price growth of Wakad over 1 year", ["Wakad"])
+        self.assertEqual(answer.intent.kind, "growth")
+        self.assertAlmostEqual(answer.results[0]["growth_pct"], 10.0)
+        self.assertEqual(answer.results[0]["from_year"], 2021)
+        self.assertIsNone(self.ask("price growth of Wakad over 9 years", ["Wakad"]))
+
+    def test_comparison(self):
+        answer = self.ask("Compare Wakad and Aundh", ["Wakad", "Aundh"])
+        self.assertEqual(answer.intent.kind, "comparison")
+        self.assertEqual([r["area"] for r in answer.results], ["Aundh", "Wakad"])
+        self.assertEqual(answer.areas, ["Wakad", "Aundh"])
+
+    def test_trend_reports_cagr(self):
+        answer = self.ask("Average price trend for Wakad", ["Wakad"])
+        self.assertEqual(answer.intent.kind, "trend")
+        self.assertAlmostEqual(answer.results[0]["growth_pct"], 21.0)
+        self.assertAlmostEqual(answer.results[0]["cagr_pct"], 10.0)
+        self.assertIn("+10.0% a year", answer.summary)
+
+    def test_no_intent(self):
+        self.assertIsNone(parse_intent("hello", []))
+        self.assertIsNone(parse_intent("Wakad", ["Wakad"]))
+        self.assertIsNone(parse_intent("highest demand in Wakad", ["Wakad"]))
+        self.assertIsNone(parse_intent("Wakad and Aundh", ["Wakad", "Aundh"]))
+        # No demand column: the question cannot be answered.
+        intent = parse_intent("Which area has highest demand?", [])
+        self.assertIsNone(run_intent(intent, self.cube, {"price": self.PRICE, "demand": None}, self.names))
+
+    def test_top_k(self):
+        values = np.array([3.0, np.nan, 1.0, 5.0, 2.0])
+        self.assertEqual(top_k(values, 2).tolist(), [3, 0])
+        self.assertEqual(top_k(values, 2, descending=False).tolist(), [2, 4])
+        self.assertEqual(top_k(values, 10).tolist(), [3, 0, 4, 2])
+        self.assertEqual(top_k(np.array([np.nan]), 1).tolist(), [])
+
+
+class TableQueryTests(SimpleTestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({"area": ["b", "a", "c", "a"], "year": [2021, 2020, 2022, 2023], "x": [1, 2, 3, 4]})
+
+    def test_parameters(self):
+        query = TableQuery({"limit": "2", "offset": "1", "sort": "area,-year", "fields": '["year", "x"]'})
+        self.assertEqual((query.limit, query.offset), (2, 1))
+        self.assertEqual(query.sort, ["area", "-year"])
+        self.assertEqual(query.fields, ["year", "x"])
+        self.assertEqual(TableQuery({}).limit, 200)
+        for bad in ({"limit": "0"}, {"limit": "10001"}, {"offset": "-1"}, {"limit": "many"}):
+            with self.assertRaises(ValueError):
+                TableQuery(bad)
+        with self.assertRaises(ValueError):
+            TableQuery({"fields": "nope"}).validate(self.df)
+
+    def test_page_sort_and_project(self):
+        query = TableQuery({"limit": 2, "offset": 1, "sort": ["area", "-year"], "fields": ["year"]})
+        page, total = query.page(self.df)
+        self.assertEqual(total, 4)
+        self.assertEqual(page.columns.tolist(), ["year"])
+        self.assertEqual(page["year"].tolist(), [2020, 2021])  # a/2023, [a/2020, b/2021], c/2022
+        self.assertEqual(query.meta(total)["next_offset"], 3)
+        self.assertIsNone(TableQuery({"offset": 3, "limit": 2}).meta(4)["next_offset"])
+
+        page, total = TableQuery({}).page(self.df, np.array([3, 1]))
+        self.assertEqual((page["x"].tolist(), total), ([4, 2], 2))
+
+
+class TablePagingViewTests(TestCase):
+    def analyze(self, **params):
+        response = self.client.get("/api/analyze/", {"query": "Wakad", **params})
+        return response.status_code, json.loads(response.content)
+
+    def test_following_next_offset_returns_every_row_once(self):
+        rows, offset = [], 0
+        while offset is not None:
+            status, payload = self.analyze(limit=2, offset=offset, sort="-year", fields="year")
+            self.assertEqual(status, 200)
+            rows += payload["table_data"]
+            offset = payload["next_offset"]
+        self.assertEqual(len(rows), payload["total_rows"])
+        years = [r["year"] for r in rows]
+        self.assertEqual(years, sorted(years, reverse=True))
+        self.assertEqual({k for r in rows for k in r}, {"year"})
+
+    def test_invalid_parameters_are_rejected(self):
+        self.assertEqual(self.analyze(limit=0)[0], 400)
+        status, payload = self.analyze(fields="year,nope")
+        self.assertEqual(status, 400)
+        self.assertIn("nope", payload["error"])
+        self.assertEqual(self.analyze(sort="-nope")[0], 400)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def get(self, query="Average price trend for Wakad", if_none_match=None):
+        headers = {"If-None-Match": if_none_match} if if_none_match else {}
+        return self.client.get("/api/analyze/", {"query": query}, headers=headers)
+
+    def test_repeat_get_is_served_from_cache(self):
+        first = self.get()
+        hits = response_cache_stats()["hits"]
+        with mock.patch.object(AnalyzeAPIView, "build", side_effect=AssertionError("recomputed")):
+            second = self.get("  average PRICE trend for wakad?")
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertEqual(response_cache_stats()["hits"] - hits, 1)
+
+    def test_if_none_match_gets_304(self):
+        etag = self.get()["ETag"]
+        for value in (etag, f'"other", {etag}', "*"):
+            response = self.get(if_none_match=value)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b"")
+            self.assertEqual(response["ETag"], etag)
+        self.assertEqual(self.get(if_none_match='"other"').status_code, 200)
+
+    def test_post_never_gets_304(self):
+        etag = self.get()["ETag"]
+        response = self.client.post(
+            "/api/analyze/", {"query": "Average price trend for Wakad"},
+            content_type="application/json", headers={"If-None-Match": etag},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], etag)
+        self.assertIn("summary", json.loads(response.content))
+
+
+class RankingViewTests(TestCase):
+    def test_ranking_without_area_brings_ranked_areas_into_scope(self):
+        response = self.client.get("/api/analyze/", {"query": "top 3 cheapest areas", "limit": 1000})
+        self.assertEqual(response.status_code, 200)
+        payload = json.loads(response.content)
+        ranked = [r["area"] for r in payload["intent"]["results"]]
+        self.assertEqual(len(ranked), 3)
+        self.assertEqual(list(payload["chart_data"]), ranked)
+        self.assertTrue(payload["table_data"])
+        self.assertEqual(
+            {row["final location"].lower() for row in payload["table_data"]},
+            {a.lower() for a in ranked},
+        )
+
+
+class AreaMatcherTests(SimpleTestCase):
+    def test_whole_words_longest_name_dataset_order(self):
+        matcher = AreaMatcher(["Wakad", "Baner", "Baner Road", "BANER", "Pimple Saudagar", "Aundh"])
+        self.assertEqual(
+            matcher.find("compare baner road, wakad and pimple saudagar"),
+            ["Wakad", "Baner Road", "Pimple Saudagar"],  # in dataset order
+        )
+        self.assertEqual(matcher.find("Banerjee and Aundhkar"), [])
+        self.assertEqual(matcher.find("BANER prices"), ["Baner"])
+
+
+class PartialReadTests(SimpleTestCase):
+    def setUp(self):
+        rows = [["area", "year", "rate", "note"]]
+        for i in range(600):
+            rows.append([["Wakad", "Aundh", "Baner"][i % 3], 2000 + i % 20, i * 1.5, f"n{i}"])
+        self.workbook = workbook_bytes(*rows)
+        self.full = pd.read_excel(io.BytesIO(self.workbook), engine="openpyxl")
+
+    def read(self, selection):
+        with mock.patch("analyzer.xlsx_reader.CHUNK_SIZE", 4096):  # many screened batches
+            return read_xlsx(io.BytesIO(self.workbook), lambda names: selection)
+
+    def test_matching_rows_and_needed_columns_only(self):
+        got = self.read(Selection(["year", "rate"], "area", lambda v: v == "Aundh"))
+        expected = self.full[self.full["area"] == "Aundh"][["area", "year", "rate"]]
+        pd.testing.assert_frame_equal(got, expected.reset_index(drop=True))
+
+    def test_no_matching_rows_raises(self):
+        with self.assertRaises(XLSXReaderError):
+            self.read(Selection(None, "area", lambda v: v == "Nowhere"))
@@ -0,0 +1,326 @@
+"""
+Ingestion of uploaded workbooks.
+
+Uploads used to be copied into ``MEDIA_ROOT/<slugified name>`` and parsed
+again from there: two passes, extra disk I/O, and same-named uploads
+overwriting each other. Now:
+
+* ``HashingUploadHandler`` (first in ``FILE_UPLOAD_HANDLERS``) computes the
+  SHA-256 of each file while Django receives it, without buffering;
+* the workbook is parsed straight from the ``UploadedFile`` Django built
+  (memory for small files, its own temp file for large ones), at most
+  once per content: ``upload_cache`` keeps parsed datasets by SHA-256 in
+  a memory-bounded LRU, and concurrent uploads of the same bytes share
+  one parse;
+* the file is written to ``MEDIA_ROOT/uploads/<sha256>.xlsx`` only when
+  ``ANALYZER_RETAIN_UPLOADS`` is on; identical uploads share that file;
+* a large retained upload that is not cached yet and whose query names
+  areas is read partially (``analyzer.pushdown``): only the matching rows
+  and needed columns are decoded, and that dataset serves the one request.
+  The full parse then runs in the background into ``upload_cache``, so
+  later uploads of the same bytes still parse it once.
+
+The SHA-256 doubles as a ``dataset_id``: ``POST /api/datasets/`` uploads a
+workbook once and later ``/api/analyze/`` calls name it instead of sending
+the file again, for as long as it stays in ``upload_cache``
+(``ANALYZER_UPLOAD_TTL`` seconds since last use) or on disk.
+
+A zip-based .xlsx cannot be parsed front to back (its directory is at the
+end), so the upload stays seekable; what is gone is the second copy.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+
+from .dataset_cache import Dataset, read_dataset
+from .singleflight import SingleFlight
+from .xlsx_reader import XLSXReaderError
+
+
+UPLOAD_DIR = "uploads"
+DATASET_ID_RE = re.compile(r"[0-9a-f]{64}")
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """Pass-through handler recording ``request.upload_sha256[field_name]``."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self._sha = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self._sha.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not hasattr(self.request, "upload_sha256"):
+            self.request.upload_sha256 = {}
+        self.request.upload_sha256[self.field_name] = self._sha.hexdigest()
+        return None  # the next handler builds the UploadedFile
+
+
+def upload_sha256(request, field_name: str, uploaded_file) -> str:
+    """SHA-256 from the upload handler, or from one pass over the file if it did not run."""
+    sha = getattr(request, "upload_sha256", {}).get(field_name)
+    if sha is None:
+        h = hashlib.sha256()
+        for chunk in uploaded_file.chunks():
+            h.update(chunk)
+        sha = h.hexdigest()
+    return sha
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+class _Entry:
+    def __init__(self, dataset: Dataset, nbytes: int):
+        self.dataset = dataset
+        self.nbytes = nbytes
+        self.last_used = time.time()
+
+
+class UploadCache:
+    """
+    Parsed upload datasets (dataset sessions) keyed by content SHA-256.
+
+    Entries expire after ``ttl`` seconds without use and are evicted least
+    recently used first once their frames exceed ``max_bytes`` in total.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, ttl: Optional[int] = None):
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._counters = {"hits": 0, "misses": 0, "parses": 0, "evictions": 0, "expirations": 0,
+                          "partial_parses": 0}
+        self._scheduled = set()  # full parses queued after a partial read
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes if self._max_bytes is not None else settings.ANALYZER_UPLOAD_CACHE_BYTES
+
+    @property
+    def ttl(self) -> int:
+        return self._ttl if self._ttl is not None else settings.ANALYZER_UPLOAD_TTL
+
+    def _drop(self, sha: str, counter: str) -> None:
+        entry = self._entries.pop(sha)
+        self._bytes -= entry.nbytes
+        self._counters[counter] += 1
+
+    def _expire(self, now: float) -> None:
+        # Least recently used first, so stop at the first live entry.
+        while self._entries:
+            sha, entry = next(iter(self._entries.items()))
+            if now - entry.last_used <= self.ttl:
+                break
+            self._drop(sha, "expirations")
+
+    def get(self, sha: str) -> Optional[Dataset]:
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(sha)
+            if entry is None:
+                return None
+            entry.last_used = now
+            self._entries.move_to_end(sha)
+            return entry.dataset
+
+    def put(self, sha: str, dataset: Dataset) -> None:
+        entry = _Entry(dataset, frame_nbytes(dataset.df))
+        with self._lock:
+            if sha in self._entries:
+                old = self._entries.pop(sha)
+                self._bytes -= old.nbytes
+            self._entries[sha] = entry
+            self._bytes += entry.nbytes
+            self._expire(entry.last_used)
+            # Keep the newest entry even if it alone is over budget.
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._drop(next(iter(self._entries)), "evictions")
+
+    def get_or_parse(self, sha: str, fileobj) -> Dataset:
+        """Cached dataset for ``sha``; concurrent misses share one parse."""
+        dataset = self.get(sha)
+        with self._lock:
+            self._counters["hits" if dataset is not None else "misses"] += 1
+        if dataset is not None:
+            return dataset
+        return self._flight.do(sha, lambda: self._parse(sha, fileobj))
+
+    def _parse(self, sha: str, fileobj) -> Dataset:
+        dataset = self.get(sha)  # parsed by a leader that finished meanwhile
+        if dataset is None:
+            fileobj.seek(0)
+            df, report = read_dataset(fileobj)
+            dataset = Dataset(df, version=sha, report=report)
+            self.put(sha, dataset)
+            with self._lock:
+                self._counters["parses"] += 1
+        return dataset
+
+    def parse_selected(self, sha: str, fileobj, select) -> Optional[Dataset]:
+        """
+        Dataset of the part of the upload ``select`` keeps, not cached; None
+        when the sheet has to be read whole.
+        """
+        try:
+            fileobj.seek(0)
+            df, report = read_dataset(fileobj, select)
+        except XLSXReaderError:
+            return None
+        except Exception as e:
+            print("UPLOAD PUSHDOWN ERROR:", e)
+            return None
+        with self._lock:
+            self._counters["partial_parses"] += 1
+        return Dataset(df, version=sha, report=report, partial=True)
+
+    def schedule_parse(self, sha: str, path: str) -> None:
+        """Parse the retained upload at ``path`` into the cache in the background."""
+        with self._lock:
+            if sha in self._scheduled or sha in self._entries:
+                return
+            self._scheduled.add(sha)
+        _background.submit(self._parse_retained, sha, path)
+
+    def _parse_retained(self, sha: str, path: str) -> None:
+        try:
+            with open(path, "rb") as f:
+                self.get_or_parse(sha, f)
+        except Exception as e:
+            print("UPLOAD PARSE ERROR:", e)
+        finally:
+            with self._lock:
+                self._scheduled.discard(sha)
+
+    def is_scheduled(self, sha: str) -> bool:
+        with self._lock:
+            return sha in self._scheduled
+
+    def describe(self, sha: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(sha)
+            return self._describe(sha, entry, time.time()) if entry is not None else None
+
+    def _describe(self, sha: str, entry: _Entry, now: float) -> Dict[str, Any]:
+        return {
+            "dataset_id": sha,
+            "rows": len(entry.dataset.df),
+            "rejected_rows": len(entry.dataset.report.rejected_rows),
+            "bytes": entry.nbytes,
+            "idle": round(now - entry.last_used, 1),
+            "expires_in": round(max(self.ttl - (now - entry.last_used), 0), 1),
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            out = dict(
+                self._counters,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_bytes=self.max_bytes,
+                ttl=self.ttl,
+            )
+        return out
+
+
+_background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload-parse")
+upload_cache = UploadCache()
+
+
+def upload_path(sha: str) -> str:
+    return os.path.join(settings.MEDIA_ROOT, UPLOAD_DIR, f"{sha}.xlsx")
+
+
+def store_upload(uploaded_file, sha: str) -> str:
+    """Persist the upload under its SHA-256 (once per content) and return its path."""
+    path = upload_path(sha)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        uploaded_file.seek(0)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as dest:
+                for chunk in uploaded_file.chunks():
+                    dest.write(chunk)
+            os.replace(tmp, path)  # same content either way, so racing writers are fine
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+    return path
+
+
+def is_dataset_id(value: str) -> bool:
+    return bool(DATASET_ID_RE.fullmatch(value or ""))
+
+
+def load_upload(sha: str) -> Optional[Dataset]:
+    """Dataset for an upload's SHA-256: resident in memory, or re-parsed if retained."""
+    dataset = upload_cache.get(sha)
+    if dataset is not None:
+        return dataset
+    path = upload_path(sha)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return upload_cache.get_or_parse(sha, f)
+
+
+def _pushdown_applies(uploaded_file, sha: str) -> bool:
+    threshold = settings.ANALYZER_UPLOAD_PUSHDOWN_BYTES
+    # Retained, so results and the dataset_id can be served from the whole file.
+    return (
+        settings.ANALYZER_FAST_XLSX_READER
+        and settings.ANALYZER_RETAIN_UPLOADS
+        and 0 < threshold <= uploaded_file.size
+        and upload_cache.get(sha) is None
+        # Already being parsed in full: share that parse instead.
+        and not upload_cache.is_scheduled(sha)
+    )
+
+
+def ingest_upload(request, field_name: str = "file", select=None) -> Tuple[Dataset, Optional[str]]:
+    """
+    Parse the uploaded workbook; returns (dataset, retained path or None).
+
+    With ``select`` (see ``analyzer.pushdown``), a large upload not parsed
+    before is read partially and the dataset is marked ``partial``; the full
+    parse is scheduled from the retained file.
+    """
+    uploaded_file = request.FILES[field_name]
+    sha = upload_sha256(request, field_name, uploaded_file)
+    if select is not None and _pushdown_applies(uploaded_file, sha):
+        dataset = upload_cache.parse_selected(sha, uploaded_file, select)
+        if dataset is not None:
+            path = store_upload(uploaded_file, sha)
+            upload_cache.schedule_parse(sha, path)
+            return dataset, path
+    dataset = upload_cache.get_or_parse(sha, uploaded_file)
+    path = store_upload(uploaded_file, sha) if settings.ANALYZER_RETAIN_UPLOADS else None
+    return dataset, path
@@ -1,7 +1,17 @@
 from django.urls import path
-from .views import AnalyzeAPIView, DownloadXLSXAPIView
+from .views import (
+    AnalyzeAPIView,
+    DatasetUploadAPIView,
+    DownloadXLSXAPIView,
+    ResultDownloadAPIView,
+    StatsAPIView,
+)
 
 urlpatterns = [
     path('analyze/', AnalyzeAPIView.as_view(), name='analyze'),
+    path('datasets/', DatasetUploadAPIView.as_view(), name='datasets'),
     path('download-xlsx/', DownloadXLSXAPIView.as_view(), name='download-xlsx'),
+    path('download-xlsx/<str:result_id>/', ResultDownloadAPIView.as_view(), name='download-xlsx-result'),
+    path('download/<str:result_id>/', ResultDownloadAPIView.as_view(), name='download-result'),
+    path('stats/', StatsAPIView.as_view(), name='stats'),
 ]
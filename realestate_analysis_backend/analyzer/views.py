@@ -3,28 +3,38 @@ import pandas as pd
 import numpy as np
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.negotiation import DefaultContentNegotiation
 from django.conf import settings
-from django.core.files.storage import default_storage
-from django.utils.text import slugify
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
 from typing import Optional, Tuple, List, Dict, Any
 
-from groq import Groq
-
+from .aggregates import AggregateCube
+from .area_index import AreaIndex
+from .area_matcher import AreaMatcher
+from .dataset_cache import Dataset, dataset_cache
+from .encoders import json_chunks
+from .exporters import ExportError, export_response
+from .intents import display_names, parse_intent, run_intent
+from .llm import llm_stats, start_llm_summary
+from .pushdown import analysis_selection
+from .response_cache import (
+    count_response,
+    get_response,
+    make_etag,
+    response_cache_stats,
+    response_key,
+    store_response,
+)
+from .results import load_result, make_spec, result_frame, save_result
+from .schema import schema_cache_stats, schema_for
+from .singleflight import analysis_flight
+from .table import TableQuery
+from .uploads import ingest_upload, is_dataset_id, load_upload, upload_cache, upload_path
 
 
 # Helpers
 
-def find_column(df: pd.DataFrame, candidates: List[str]) -> Optional[str]:
-    """Return the first matching column name."""
-    cols = list(df.columns)
-    for cand in candidates:
-        for c in cols:
-            if cand.lower() in c.lower():
-                return c
-    return None
-
-
 def pct_change(new: float, old: float) -> Optional[float]:
     """Calculate percentage change safely."""
     try:
@@ -64,83 +74,47 @@ def clean_nans(obj):
     return obj
 
 
-def detect_areas(query: str, df: pd.DataFrame) -> Tuple[Optional[str], List[str]]:
+def detect_areas(
+    query: str, df: pd.DataFrame, matcher: Optional[AreaMatcher] = None
+) -> Tuple[Optional[str], List[str]]:
     """Identify areas mentioned in the query."""
-    q = (query or "").lower()
-    area_col = None
-
-    for col in df.columns:
-        if any(k in col.lower() for k in ["area", "local", "location"]):
-            area_col = col
-            break
-
-    if area_col is None:
+    if matcher is None:
+        matcher = AreaMatcher.for_frame(df)
+    if matcher.column is None:
         return None, []
-
-    found = []
-    for v in df[area_col].dropna().unique():
-        if isinstance(v, str) and v.lower() in q:
-            found.append(v)
-
-    return area_col, found
+    return matcher.column, matcher.find(query)
 
 
 
 # Summary generation
 
-def improved_summary(areas, df, area_col):
+def improved_summary(areas, df, area_col, cube: Optional[AggregateCube] = None):
     """Base summary before LLM enhancement."""
     if not areas:
         return f"No specific area detected. Dataset contains {len(df)} records."
 
-    price_col = find_column(df, [
-        "flat - weighted average rate", "weighted average rate", "avg price", "price"
-    ])
-    demand_col = find_column(df, [
-        "total sold - igr", "total sold", "total_sales - igr"
-    ])
-    year_col = find_column(df, ["year"])
+    schema = schema_for(df)
+    price_col = schema.price
+    demand_col = schema.demand
+
+    if cube is None:
+        cube = AggregateCube(df, area_col, schema.year, schema.metric_columns)
 
     parts = []
 
     for area in areas:
-        subset = df[df[area_col].astype(str).str.lower() == area.lower()]
-
-        if subset.empty:
+        if not cube.has_area(area):
             parts.append(f"No data found for {area}.")
             continue
 
-        try:
-            years = (
-                subset[year_col]
-                .dropna()
-                .astype(str)
-                .str.strip()
-                .apply(lambda x: int(float(x)))
-                .sort_values()
-                .tolist()
-            )
-        except:
-            years = []
-
+        years = cube.years_for(area)
         latest_year = years[-1] if years else None
         prev_year   = years[-2] if len(years) > 1 else None
 
-        def safe_avg(col, year):
-            if col is None or year is None:
-                return None
-            try:
-                vals = subset[
-                    subset[year_col].astype(str).str.strip().astype(float) == float(year)
-                ][col].dropna()
-                return float(vals.mean()) if not vals.empty else None
-            except:
-                return None
-
-        price_latest  = safe_avg(price_col, latest_year)
-        price_prev    = safe_avg(price_col, prev_year)
-        demand_latest = safe_avg(demand_col, latest_year)
-        demand_prev   = safe_avg(demand_col, prev_year)
+        price_latest  = cube.mean(price_col, area, latest_year)
+        price_prev    = cube.mean(price_col, area, prev_year)
+        demand_latest = cube.mean(demand_col, area, latest_year)
+        demand_prev   = cube.mean(demand_col, area, prev_year)
 
         msg = f"Analysis for {area}:"
         if latest_year:
@@ -166,166 +140,279 @@ def improved_summary(areas, df, area_col):
 
 
 
-# LLM summary enhancer (Grok)
-
-def generate_llm_summary(areas, base_summary):
-    api_key = os.getenv("GROK_API_KEY")
-    if not api_key:
-        return base_summary
-
-    try:
-        client = Groq(api_key=api_key)
-
-        prompt = f"""
-Rewrite this real estate summary in a cleaner, more professional way.
-Do NOT modify numbers or add new information.
-
-Areas: {areas}
-Original Summary:
-{base_summary}
-        """
-
-        response = client.chat.completions.create(
-            model="grok-2-1212",
-            messages=[
-                {"role": "system", "content": "Rewrite real estate analysis clearly and professionally."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.4,
-            max_tokens=200
-        )
-
-        return response.choices[0].message["content"].strip()
-
-    except Exception as e:
-        print("GROK LLM ERROR:", e)
-        return base_summary
-
+# Main Analysis API
 
+def etag_response(request, body: bytes, etag: str, conditional: bool) -> HttpResponse:
+    """JSON body with its ETag, or 304 when a conditional request already has it."""
+    if conditional:
+        if_none_match = request.headers.get("If-None-Match", "")
+        if if_none_match.strip() == "*" or etag in parse_etags(if_none_match):
+            count_response("not_modified")
+            response = HttpResponse(status=304)
+            response["ETag"] = etag
+            return response
+    response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    return response
 
-# Main Analysis API
 
 class AnalyzeAPIView(APIView):
     def post(self, request):
-        query = request.data.get("query", "")
+        return self.analyze(request, request.data)
+
+    def get(self, request):
+        # Same analysis from query parameters; honours If-None-Match.
+        return self.analyze(request, request.query_params, conditional=True)
+
+    def analyze(self, request, params, conditional: bool = False):
+        query = params.get("query", "")
         uploaded_file = request.FILES.get("file")
+        dataset_id = params.get("dataset_id")
+
+        try:
+            table_query = TableQuery(params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
 
         try:
             if uploaded_file:
-                filename = slugify(uploaded_file.name)
-                filepath = os.path.join(settings.MEDIA_ROOT, filename)
-                os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
-                with default_storage.open(filepath, "wb+") as dest:
-                    for chunk in uploaded_file.chunks():
-                        dest.write(chunk)
-                df = pd.read_excel(filepath, engine="openpyxl")
+                dataset, source_path = ingest_upload(
+                    request, select=analysis_selection(query, table_query)
+                )
+                source_kind = "upload"
+                if dataset.partial and not self.detect(dataset, query)[1]:
+                    # The kept rows did not read as areas after all.
+                    dataset, source_path = ingest_upload(request)
+
+            elif dataset_id:
+                if not is_dataset_id(dataset_id):
+                    return Response({"error": "Invalid dataset_id."}, status=400)
+                dataset = load_upload(dataset_id)
+                if dataset is None:
+                    return Response({"error": "Unknown or expired dataset_id."}, status=404)
+                path = upload_path(dataset_id)
+                source_kind, source_path = "upload", path if os.path.exists(path) else None
 
             else:
-                base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-                excel_path = os.path.join(base_dir, "data", "sample_realestate.xlsx")
+                excel_path = settings.ANALYZER_DATASET_PATH
                 if not os.path.exists(excel_path):
                     return Response({"error": "Dataset not found."}, status=400)
-                df = pd.read_excel(excel_path, engine="openpyxl")
+                dataset = dataset_cache.get(excel_path)
+                source_kind, source_path = "bundled", excel_path
 
         except Exception as e:
             return Response({"error": f"Failed to load Excel: {str(e)}"}, status=400)
 
-        area_col, detected_areas = detect_areas(query, df)
+        # A dataset_id names fixed content, like the bundled dataset's version.
+        cache_key = None
+        if source_kind == "bundled" or (dataset_id and not uploaded_file):
+            cache_key = response_key(dataset.version, query, table_query)
+            cached = get_response(cache_key)
+            if cached is not None:
+                save_result(cached["spec"])  # keep its result_id downloadable
+                return etag_response(request, cached["body"], cached["etag"], conditional)
 
-        base_summary = improved_summary(detected_areas, df, area_col)
-        summary = generate_llm_summary(detected_areas, base_summary)
-
-        chart_data = {}
-        table_data = []
-
-        price_col  = find_column(df, ["flat - weighted average rate", "weighted average rate"])
-        demand_col = find_column(df, ["total sold - igr", "total sold"])
-        year_col   = find_column(df, ["year"])
+        try:
+            table_query.validate(dataset.df)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        if cache_key is None:
+            payload, table, _, _ = self.build(dataset, query, table_query, source_kind, source_path)
+            return StreamingHttpResponse(
+                json_chunks(payload, "table_data", table),
+                content_type="application/json",
+            )
 
-        if detected_areas:
-            for area in detected_areas:
-                subset = df[df[area_col].astype(str).str.lower() == area.lower()]
-                rows = []
+        def render():
+            payload, table, spec, final = self.build(
+                dataset, query, table_query, source_kind, source_path
+            )
+            body = b"".join(json_chunks(payload, "table_data", table))
+            entry = {"body": body, "etag": make_etag(body), "spec": spec}
+            if final:
+                store_response(cache_key, **entry)
+            return entry
+
+        # Identical concurrent requests wait for one computation.
+        entry = analysis_flight.do(cache_key, render)
+        return etag_response(request, entry["body"], entry["etag"], conditional)
+
+    def detect(self, dataset: Dataset, query: str) -> Tuple[Optional[str], List[str]]:
+        matcher = dataset.derive("area_matcher", lambda: AreaMatcher.for_frame(dataset.df))
+        return detect_areas(query, dataset.df, matcher)
+
+    def build(self, dataset: Dataset, query: str, table_query: TableQuery,
+              source_kind: str, source_path: str):
+        """(payload, table page, result spec, whether the summary is final)."""
+        df = dataset.df
+
+        matcher = dataset.derive("area_matcher", lambda: AreaMatcher.for_frame(df))
+        area_col, detected_areas = self.detect(dataset, query)
+
+        schema = schema_for(df)
+        price_col  = schema.price
+        demand_col = schema.demand
+        year_col   = schema.year
+
+        cube = dataset.derive("aggregate_cube", lambda: AggregateCube(
+            df, area_col, year_col, schema.metric_columns
+        ))
+
+        area_index = dataset.derive("area_index", lambda: AreaIndex(df, area_col, year_col))
+
+        metrics = {"price": price_col, "demand": demand_col}
+
+        # Ranking/comparison/growth/trend questions are answered from the cube;
+        # a ranking with no area named brings its top areas into scope.
+        answer = None
+        intent = parse_intent(query, detected_areas)
+        if intent is not None:
+            names = dataset.derive("area_names", lambda: display_names(matcher.names))
+            answer = run_intent(intent, cube, metrics, names)
+        areas = detected_areas or (answer.areas if answer is not None else [])
+
+        if answer is not None and not detected_areas:
+            base_summary = answer.summary
+        else:
+            base_summary = improved_summary(detected_areas, df, area_col, cube)
+            if answer is not None:
+                base_summary = f"{base_summary} {answer.summary}"
+        # The rewrite runs while chart and table data are built below.
+        llm_summary = start_llm_summary(areas, base_summary)
 
-                if year_col:
-                    grouped = subset.groupby(year_col)
-                    for y, grp in grouped:
-                        try:
-                            y_clean = int(float(str(y).strip()))
-                        except:
-                            continue
+        chart_data = {}
 
-                        item = {"year": y_clean}
-                        if price_col:
-                            v = grp[price_col].dropna()
-                            item["price"] = float(v.mean()) if not v.empty else None
-                        if demand_col:
-                            v2 = grp[demand_col].dropna()
-                            item["demand"] = float(v2.mean()) if not v2.empty else None
+        if areas:
+            for area in areas:
+                chart_data[area] = cube.series(area, metrics) if year_col else []
+            positions = area_index.rows_for(areas)
 
-                        rows.append(item)
+        else:
+            if year_col:
+                chart_data["dataset"] = cube.dataset_series(metrics)
 
-                    rows = sorted(rows, key=lambda x: x["year"])
+            positions = None
 
-                chart_data[area] = rows
-                table_data.extend(subset.to_dict(orient="records"))
+        table, total_rows = table_query.page(df, positions)
+        spec = make_spec(source_kind, source_path, dataset.version, areas, table_query)
+        result_id = save_result(spec)
 
-        else:
-            rows = []
-            if year_col:
-                grouped = df.groupby(year_col)
-                for y, grp in grouped:
-                    try:
-                        y_clean = int(float(str(y).strip()))
-                    except:
-                        continue
-
-                    item = {"year": y_clean}
-                    if price_col:
-                        v = grp[price_col].dropna()
-                        item["price"] = float(v.mean()) if not v.empty else None
-                    if demand_col:
-                        v2 = grp[demand_col].dropna()
-                        item["demand"] = float(v2.mean()) if not v.empty else None
-                    rows.append(item)
-
-                rows = sorted(rows, key=lambda x: x["year"])
-                chart_data["dataset"] = rows
-
-            table_data = df.to_dict(orient="records")
-
-        cleaned = {
-            "summary": summary,
+        payload = {
+            "summary": llm_summary.result(),
             "chart_data": clean_nans(chart_data),
-            "table_data": clean_nans(table_data[:200])
         }
-
-        return Response(cleaned, status=200)
+        if answer is not None:
+            payload["intent"] = answer.to_dict()
+        payload["result_id"] = result_id
+        if source_kind == "upload":
+            payload["dataset_id"] = dataset.version
+        payload.update(table_query.meta(total_rows))
+        return payload, table, spec, llm_summary.final
 
 
 
 # XLSX Download API
 
+class ExportNegotiation(DefaultContentNegotiation):
+    """Leave ?format= to the export views instead of DRF's renderer override."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
 class DownloadXLSXAPIView(APIView):
+    content_negotiation_class = ExportNegotiation
+
     def post(self, request):
         try:
             rows = request.data.get("table_data", [])
             if not rows:
                 return Response({"error": "No table data provided"}, status=400)
 
-            df = pd.DataFrame(rows)
+            fmt = request.data.get("format") or request.query_params.get("format")
+            return export_response(pd.DataFrame(rows), fmt)
+
+        except ExportError as e:
+            return Response({"error": str(e)}, status=400)
+        except Exception as e:
+            return Response({"error": str(e)}, status=500)
+
 
-            from io import BytesIO
-            buffer = BytesIO()
-            df.to_excel(buffer, index=False, engine="openpyxl")
-            buffer.seek(0)
+class ResultDownloadAPIView(APIView):
+    content_negotiation_class = ExportNegotiation
 
-            response = HttpResponse(
-                buffer,
-                content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    def get(self, request, result_id):
+        spec = load_result(result_id)
+        if spec is None:
+            return Response({"error": "Unknown or expired result."}, status=404)
+
+        try:
+            df = result_frame(spec)
+        except Exception as e:
+            return Response({"error": str(e)}, status=500)
+        if df is None:
+            return Response(
+                {"error": "The dataset behind this result has changed or was not retained."},
+                status=410,
             )
-            response["Content-Disposition"] = 'attachment; filename="filtered_data.xlsx"'
-            return response
 
+        try:
+            return export_response(df, request.query_params.get("format"))
+        except ExportError as e:
+            return Response({"error": str(e)}, status=400)
         except Exception as e:
             return Response({"error": str(e)}, status=500)
+
+
+
+# Dataset sessions API
+
+class DatasetUploadAPIView(APIView):
+    def post(self, request):
+        if "file" not in request.FILES:
+            return Response({"error": "No file provided"}, status=400)
+        try:
+            dataset, _ = ingest_upload(request)
+        except Exception as e:
+            return Response({"error": f"Failed to load Excel: {str(e)}"}, status=400)
+
+        info = upload_cache.describe(dataset.version) or {
+            # evicted by a concurrent upload
+            "dataset_id": dataset.version,
+            "rows": len(dataset.df),
+            "rejected_rows": len(dataset.report.rejected_rows),
+            "expires_in": 0,
+        }
+        info.pop("idle", None)
+        info.pop("bytes", None)
+        info["columns"] = [str(c) for c in dataset.df.columns]
+        return Response(info, status=201)
+
+    def get(self, request):
+        # A dataset_id grants access to its rows: only describe the caller's own.
+        dataset_id = request.query_params.get("dataset_id")
+        if not dataset_id:
+            return Response(upload_cache.stats(), status=200)
+        if not is_dataset_id(dataset_id):
+            return Response({"error": "Invalid dataset_id."}, status=400)
+        info = upload_cache.describe(dataset_id)
+        if info is None:
+            return Response({"error": "Unknown or expired dataset_id."}, status=404)
+        info.pop("bytes", None)
+        return Response(info, status=200)
+
+
+
+# Runtime stats API
+
+class StatsAPIView(APIView):
+    def get(self, request):
+        return Response({
+            "dataset_cache": dataset_cache.stats(),
+            "upload_cache": upload_cache.stats(),
+            "schema_cache": schema_cache_stats(),
+            "llm": llm_stats(),
+            "response_cache": response_cache_stats(),
+            "coalescing": analysis_flight.stats(),
+        }, status=200)
@@ -0,0 +1,553 @@
+"""
+Fast reader for the first worksheet of an .xlsx workbook.
+
+``pd.read_excel(engine="openpyxl")`` spends most of its time in openpyxl
+turning every XML element into a cell object. ``read_xlsx`` still lets
+openpyxl read the workbook metadata (sheet order, shared strings, date
+styles, epoch) but reads the sheet XML itself:
+
+* the sheet is streamed out of the zip and complete ``<row>`` elements
+  are parsed in batches by the C XML parser, so Python code runs per row
+  and per cell instead of per XML event;
+* shared strings are resolved by list index;
+* purely numeric columns are appended to ``array('d')`` buffers and become
+  int64/float64 columns directly; other columns (text, dates, booleans,
+  errors) go through pandas' ``TextParser`` as they would in ``read_excel``;
+* cyclic garbage collection is paused while the rows are read.
+
+The result equals ``pd.read_excel(path, engine="openpyxl")``. Sheets the
+reader does not handle (cells out of order, CDATA, no data rows, ...) are
+read by pandas instead.
+
+A ``Selection`` chosen from the header row restricts the read to some
+columns and to the rows whose value in one column passes a test; other
+cells are skipped without being decoded.
+"""
+
+import gc
+import os
+import re
+from array import array
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
+from xml.etree.ElementTree import Element, fromstring
+
+import numpy as np
+import pandas as pd
+from openpyxl.cell.text import Text
+from openpyxl.reader.excel import ExcelReader
+from openpyxl.styles.stylesheet import apply_stylesheet
+from openpyxl.utils import column_index_from_string
+from openpyxl.utils.datetime import from_excel, from_ISO8601
+from pandas.io.parsers import TextParser
+
+
+SHEET_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+CHUNK_SIZE = 4 * 1024 * 1024
+
+_VALUE = SHEET_MAIN_NS + "v"
+_INLINE_STRING = SHEET_MAIN_NS + "is"
+_DIGITS = "0123456789"
+# Integers past 2**53 are not exact in float64; pandas keeps them as Python ints.
+_MAX_EXACT = float(2 ** 53)
+_ROOT_RE = re.compile(rb"<((?:\w+:)?worksheet)\b[^>]*>")
+_SHEET_DATA_RE = re.compile(rb"<((?:\w+:)?)sheetData\b[^>]*?(/?)>")
+_ROW_NUMBER_RE = re.compile(rb"(?:^|\s)(r=[\"']\d+[\"'])")
+# Cell types whose string is not in the shared strings table.
+_STRING_TYPES = (b't="inlineStr"', b"t='inlineStr'", b't="str"', b"t='str'")
+# More shared strings passing the row filter than this and rows are not screened.
+_MAX_SCREENED_STRINGS = 1000
+
+
+class XLSXReaderError(ValueError):
+    """The sheet uses a layout left to pandas."""
+
+
+class Selection:
+    """
+    Part of a sheet to read: the columns to decode (None for all) and, if
+    ``filter_column`` is set, only the rows whose value there passes
+    ``keep_row``. Column names are those ``read_excel`` would give.
+    """
+
+    def __init__(
+        self,
+        columns: Optional[Iterable[Any]] = None,
+        filter_column: Any = None,
+        keep_row: Optional[Callable[[Any], bool]] = None,
+    ):
+        self.columns = columns
+        self.filter_column = filter_column if keep_row is not None else None
+        self.keep_row = keep_row
+
+
+def read_xlsx(
+    path_or_buffer, select: Optional[Callable[[List[Any]], Optional[Selection]]] = None
+) -> pd.DataFrame:
+    """
+    Same frame as ``pd.read_excel(path_or_buffer, engine="openpyxl")``, read faster.
+
+    ``select`` is called with the column names once the header row is read
+    and returns the ``Selection`` to decode, or None to give up. Such a
+    partial read never falls back to pandas: it raises ``XLSXReaderError``
+    instead, also when no row is kept.
+    """
+    if select is not None:
+        return _read_first_sheet(path_or_buffer, select)
+    try:
+        return _read_first_sheet(path_or_buffer)
+    except XLSXReaderError:
+        pass
+    except Exception as e:
+        print("XLSX READER ERROR:", e)
+    if hasattr(path_or_buffer, "seek"):
+        path_or_buffer.seek(0)
+    return pd.read_excel(path_or_buffer, engine="openpyxl")
+
+
+def _read_first_sheet(path_or_buffer, select=None) -> pd.DataFrame:
+    if isinstance(path_or_buffer, (str, os.PathLike)):
+        with open(path_or_buffer, "rb") as f:
+            return _read_first_sheet(f, select)
+
+    # openpyxl's own steps for the workbook metadata. load_workbook would also
+    # open every sheet, which scans the whole sheet when it has no <dimension>.
+    reader = ExcelReader(path_or_buffer, read_only=True, data_only=True, keep_links=False)
+    try:
+        reader.read_manifest()
+        reader.read_strings()
+        reader.read_workbook()
+        apply_stylesheet(reader.archive, reader.wb)
+        for _, rel in reader.parser.find_sheets():
+            if rel.target in reader.valid_files and "chartsheet" not in rel.Type:
+                break
+        else:
+            raise XLSXReaderError("no worksheet")
+
+        sheet = _SheetBuffers(
+            reader.shared_strings, reader.wb._date_formats, reader.wb.epoch, select
+        )
+        screen = sheet.screen if select is not None else None
+        with reader.archive.open(rel.target) as src, _gc_paused():
+            for sheet_data in _row_batches(src, screen):
+                sheet.add_rows(sheet_data)
+    finally:
+        reader.archive.close()
+    return sheet.frame()
+
+
+@contextmanager
+def _gc_paused():
+    """
+    Suspend cyclic garbage collection. Parsed rows form no cycles and are
+    freed by reference counting, but allocating millions of elements would
+    otherwise trigger collections that rescan everything alive.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _row_batches(src, screen: Optional[Callable[[bytes, bytes], bytes]] = None) -> Iterator[Element]:
+    """
+    Yield ``<sheetData>`` elements, each holding the complete rows read so
+    far; ``screen`` may rewrite the rows of a batch before it is parsed.
+    """
+    buf = b""
+    while True:
+        chunk = src.read(CHUNK_SIZE)
+        buf += chunk
+        opening = _SHEET_DATA_RE.search(buf)
+        if opening is not None:
+            break
+        if not chunk:
+            return
+    root = _ROOT_RE.search(buf, 0, opening.start())
+    if root is None:
+        raise XLSXReaderError("worksheet element not found")
+    if opening.group(2):
+        return  # <sheetData/>
+
+    # Each batch is wrapped in the original start tags so namespaces resolve.
+    prefix = opening.group(1)
+    head = root.group(0) + opening.group(0)
+    tail = b"</" + prefix + b"sheetData></" + root.group(1) + b">"
+    row_end = b"</" + prefix + b"row>"
+    data_end = b"</" + prefix + b"sheetData>"
+
+    buf = buf[opening.end():]
+    while True:
+        end = buf.find(data_end)
+        if end >= 0:
+            cut = end
+        else:
+            cut = buf.rfind(row_end)
+            cut = cut + len(row_end) if cut >= 0 else 0
+        if cut:
+            batch = buf[:cut]
+            if b"<!" in batch:
+                raise XLSXReaderError("comment or CDATA in sheet data")
+            if screen is not None:
+                batch = screen(batch, prefix)
+            yield fromstring(head + batch + tail)[0]
+            buf = buf[cut:]
+        if end >= 0:
+            return
+        chunk = src.read(CHUNK_SIZE)
+        if not chunk:
+            raise XLSXReaderError("sheet data is not closed")
+        buf += chunk
+
+
+def _cast_number(value: str):
+    # As openpyxl reads a numeric cell.
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+def _pandas_number(value: str):
+    # As pandas converts a numeric cell: int when the value is integral.
+    number = _cast_number(value)
+    as_int = int(number)
+    return as_int if as_int == number else float(number)
+
+
+def _row_number(r: str) -> int:
+    try:
+        return int(r)
+    except ValueError:
+        number = float(r)
+        if not number.is_integer():
+            raise XLSXReaderError(f"{r} is not a valid row number")
+        return int(number)
+
+
+class _SheetBuffers:
+    """
+    Column buffers for one sheet, filled row by row.
+
+    A column stays an ``array('d')`` (NaN for empty cells) while every
+    value in it is a plain number, and becomes a list of the values pandas
+    would see (``""`` for empty cells) at its first other value.
+
+    With ``select``, the header row decides which columns are decoded and
+    which rows are kept; kept rows are stored one after another.
+    """
+
+    def __init__(self, shared_strings: List[str], date_formats: Set[int], epoch,
+                 select: Optional[Callable[[List[Any]], Optional[Selection]]] = None):
+        self.strings = shared_strings
+        self.date_formats = date_formats
+        self.epoch = epoch
+        self.select = select
+        self.header: List[Any] = []
+        self.columns: List[Any] = []
+        self.width = 0        # columns up to the last one holding a value
+        self.last_row = -1    # 0-based index of the last row holding a value
+        self.next_row = 1
+        self.row_number = 0
+        self._column_index: Dict[str, int] = {}
+        # Resolved from the header when ``select`` is given.
+        self.keep_columns: Optional[Set[int]] = None  # 1-based
+        self.filter_column = 0                        # 1-based, 0 for none
+        self.keep_row: Optional[Callable[[Any], bool]] = None
+        self.kept_rows = 0
+        self._screen_strings: Optional[List[bytes]] = None
+
+    def _column(self, ref: str) -> int:
+        letters = ref.rstrip(_DIGITS)
+        col = self._column_index.get(letters)
+        if col is None:
+            col = self._column_index[letters] = column_index_from_string(letters)
+        return col
+
+    def _value(self, c: Element, t: Optional[str]) -> Any:
+        """The value pandas sees for cell ``c``; None when empty."""
+        if t == "inlineStr":
+            child = c.find(_INLINE_STRING)
+            value = Text.from_tree(child).content if child is not None else None
+            return value or None
+        v = c.findtext(_VALUE)
+        if not v:
+            return None
+        if t is None or t == "n":
+            if self.date_formats:
+                s = c.get("s")
+                if s and int(s) in self.date_formats:
+                    return self._date(v)
+            return _pandas_number(v)
+        if t == "s":
+            return self.strings[int(v)] or None
+        if t == "b":
+            return bool(int(v))
+        if t == "e":
+            return np.nan
+        if t == "d":
+            return from_ISO8601(v)
+        return v
+
+    def _resolve_selection(self) -> None:
+        names = list(TextParser([self.header or [""]], header=0, skip_blank_lines=False).read().columns)
+        selection = self.select(names)
+        self.select = None
+        if selection is None:
+            raise XLSXReaderError("no selection for this header")
+        if selection.columns is not None:
+            wanted = set(selection.columns)
+            self.keep_columns = {i + 1 for i, name in enumerate(names) if name in wanted}
+        if selection.filter_column is not None and selection.filter_column in names:
+            self.filter_column = names.index(selection.filter_column) + 1
+            self.keep_row = selection.keep_row
+            if self.keep_columns is not None:
+                self.keep_columns.add(self.filter_column)
+            self._build_screen()
+
+    def _build_screen(self) -> None:
+        # Shared strings passing the row filter, as they appear in <v>.
+        passing = [str(i).encode() for i, s in enumerate(self.strings) if s and self.keep_row(s)]
+        if len(passing) <= _MAX_SCREENED_STRINGS:
+            self._screen_strings = passing
+
+    def screen(self, batch: bytes, prefix: bytes) -> bytes:
+        """
+        ``batch`` with the rows that cannot pass the row filter emptied, so
+        they are not parsed: rows without a shared string that passes. Left
+        alone if inline or formula strings may hold the filtered value.
+        """
+        if self._screen_strings is None or any(t in batch for t in _STRING_TYPES):
+            return batch
+        value_tag = b"<" + prefix + b"v>"
+        if value_tag not in batch:
+            return batch  # values are written some other way
+        values = [value_tag + i + b"</" for i in self._screen_strings]
+        if len(values) <= 4:
+            def passes(row):
+                return any(v in row for v in values)
+        else:
+            passes = re.compile(b"|".join(re.escape(v) for v in values)).search
+
+        row_start = b"<" + prefix + b"row"
+        row_end = b"</" + prefix + b"row>"
+        rows = batch.split(row_end)
+        for i in range(len(rows) - 1):
+            row = rows[i]
+            if not passes(row) and row.count(row_start) == 1:
+                # Joined back as <row r="..."></row>: the row number still counts.
+                start = row.find(row_start)
+                number = _ROW_NUMBER_RE.search(row, start, row.find(b">", start))
+                attrs = b" " + number.group(1) if number else b""
+                rows[i] = row[:start] + row_start + attrs + b">"
+        return row_end.join(rows)
+
+    def _row_kept(self, row: Element) -> bool:
+        """Whether ``row`` passes the row filter, judged from its filter cell alone."""
+        target = self.filter_column
+        col = 0
+        for c in row:
+            ref = c.get("r")
+            col = self._column(ref) if ref else col + 1
+            if col == target:
+                return self.keep_row(self._value(c, c.get("t")))
+            if col > target:
+                break
+        return self.keep_row(None)
+
+    def add_rows(self, sheet_data: Element) -> None:
+        strings = self.strings
+        date_formats = self.date_formats
+        columns = self.columns
+        column_index = self._column_index
+        header = self.header
+        numeric = array
+        nan = float("nan")
+        width = self.width
+
+        for row in sheet_data:
+            r = row.get("r")
+            self.row_number = row_number = self.row_number + 1 if r is None else _row_number(r)
+            if row_number < self.next_row:
+                continue  # openpyxl drops rows that go backwards
+            self.next_row = row_number + 1
+            pos = row_number - 2  # position among data rows; -1 is the header
+            if pos >= 0:
+                if self.select is not None:
+                    self._resolve_selection()
+                if self.filter_column:
+                    if not self._row_kept(row):
+                        continue
+                    pos = self.kept_rows
+                    self.kept_rows += 1
+            keep_columns = self.keep_columns if pos >= 0 else None
+            col = prev = 0
+            has_value = False
+
+            for c in row:
+                ref = c.get("r")
+                if ref:
+                    letters = ref.rstrip(_DIGITS)
+                    col = column_index.get(letters)
+                    if col is None:
+                        col = column_index[letters] = column_index_from_string(letters)
+                else:
+                    col += 1
+                if col <= prev:
+                    raise XLSXReaderError("cells out of order")
+                prev = col
+                if keep_columns is not None and col not in keep_columns:
+                    # Not decoded; only whether the row holds anything matters.
+                    if not has_value and self._value(c, c.get("t")) is not None:
+                        has_value = True
+                    continue
+
+                t = c.get("t")
+                if t == "inlineStr":
+                    child = c.find(_INLINE_STRING)
+                    value = Text.from_tree(child).content if child is not None else None
+                else:
+                    v = c.findtext(_VALUE)
+                    if not v:
+                        continue
+                    if t is None or t == "n":
+                        if date_formats:
+                            s = c.get("s")
+                            if s and int(s) in date_formats:
+                                value = self._date(v)
+                                t = "d"
+                        if t != "d":
+                            if pos < 0:
+                                value = _pandas_number(v)
+                            else:
+                                has_value = True
+                                ci = col - 1
+                                if ci >= len(columns):
+                                    columns.extend([None] * (ci + 1 - len(columns)))
+                                buf = columns[ci]
+                                if buf is None:
+                                    buf = columns[ci] = numeric("d")
+                                if type(buf) is numeric:
+                                    if len(buf) < pos:
+                                        buf.extend([nan] * (pos - len(buf)))
+                                    buf.append(float(v))
+                                else:
+                                    if len(buf) < pos:
+                                        buf.extend([""] * (pos - len(buf)))
+                                    buf.append(_pandas_number(v))
+                                if col > width:
+                                    width = col
+                                continue
+                    elif t == "s":
+                        value = strings[int(v)]
+                    elif t == "b":
+                        value = bool(int(v))
+                    elif t == "e":
+                        value = np.nan
+                    elif t == "d":
+                        value = from_ISO8601(v)
+                    else:
+                        value = v
+
+                if value is None or (type(value) is str and value == ""):
+                    continue
+                has_value = True
+                if col > width:
+                    width = col
+                if pos < 0:
+                    header.extend([""] * (col - 1 - len(header)))
+                    header.append(value)
+                    continue
+                ci = col - 1
+                if ci >= len(columns):
+                    columns.extend([None] * (ci + 1 - len(columns)))
+                buf = columns[ci]
+                if buf is None:
+                    buf = columns[ci] = []
+                elif type(buf) is numeric:
+                    buf = columns[ci] = _as_objects(buf)
+                if len(buf) < pos:
+                    buf.extend([""] * (pos - len(buf)))
+                buf.append(value)
+
+            if has_value:
+                self.last_row = row_number - 1
+        self.width = width
+
+    def _date(self, v: str):
+        try:
+            # Read-only openpyxl converts timedelta formats as dates too.
+            return from_excel(_cast_number(v), self.epoch)
+        except (OverflowError, ValueError):
+            return np.nan  # openpyxl marks the cell as an error
+
+    def frame(self) -> pd.DataFrame:
+        if self.select is not None:  # header only
+            self._resolve_selection()
+        # Data rows below the header; filtered rows always hold a value.
+        rows = self.kept_rows if self.filter_column else self.last_row
+        if rows < 1:
+            raise XLSXReaderError("no data rows")
+        width = self.width
+
+        header = self.header + [""] * (width - len(self.header))
+        names = TextParser([header], header=0, skip_blank_lines=False).read().columns
+        if self.keep_columns is not None:
+            positions = sorted(col - 1 for col in self.keep_columns)
+        else:
+            positions = list(range(width))
+
+        buffers = self.columns + [None] * (width - len(self.columns))
+        others = [i for i in positions if type(buffers[i]) is not array]
+        inferred = None
+        if others:
+            lists = []
+            for i in others:
+                buf = buffers[i] if buffers[i] is not None else []
+                lists.append(buf + [""] * (rows - len(buf)))
+            # Column-by-column inference, exactly as read_excel does it.
+            inferred = TextParser(
+                [list(values) for values in zip(*lists)], header=None, skip_blank_lines=False
+            ).read()
+
+        data = {}
+        inferred_position = {i: j for j, i in enumerate(others)}
+        for i in positions:
+            if i in inferred_position:
+                data[i] = inferred.iloc[:, inferred_position[i]]
+            else:
+                data[i] = _numeric_column(buffers[i], rows)
+        df = pd.DataFrame(data)
+        df.columns = names[positions]
+        return df
+
+
+def _as_objects(buf: array) -> List[Any]:
+    """The values pandas would see for a numeric buffer."""
+    values = []
+    for x in buf:
+        if x != x:
+            values.append("")
+        elif x.is_integer():
+            if abs(x) >= _MAX_EXACT:
+                raise XLSXReaderError("integer beyond float64 precision")
+            values.append(int(x))
+        else:
+            values.append(x)
+    return values
+
+
+def _numeric_column(buf: array, rows: int) -> np.ndarray:
+    if len(buf) < rows:
+        buf.extend([float("nan")] * (rows - len(buf)))
+    values = np.frombuffer(buf, dtype=np.float64)
+    if np.isinf(values).any() or (np.abs(values) >= _MAX_EXACT).any():
+        raise XLSXReaderError("number outside float64 integer precision")
+    missing = np.isnan(values)
+    if not missing.any() and (values == np.trunc(values)).all():
+        return values.astype(np.int64)
+    values = values.copy()
+    values[values == 0] = 0.0  # pandas reads -0.0 as the integer 0
+    return values
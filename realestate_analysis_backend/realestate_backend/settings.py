@@ -79,6 +79,19 @@ DATABASES = {
     }
 }
 
+# ------------------------------------------------------
+# Cache
+# ------------------------------------------------------
+# Per-process memory cache by default. Point CACHE_BACKEND/CACHE_LOCATION at
+# a shared backend (e.g. django.core.cache.backends.redis.RedisCache) so all
+# workers share cached responses. Result IDs are shared through the database.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'realestate-analyzer'),
+    }
+}
+
 # ------------------------------------------------------
 # Password Validators
 # ------------------------------------------------------
@@ -109,4 +122,75 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads are hashed while they are received (analyzer.uploads).
+FILE_UPLOAD_HANDLERS = [
+    'analyzer.uploads.HashingUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# ------------------------------------------------------
+# Analyzer
+# ------------------------------------------------------
+# Bundled workbook served when no file is uploaded. A columnar snapshot next
+# to it (built with `python manage.py build_snapshot`) is used when fresh.
+ANALYZER_DATASET_PATH = os.getenv(
+    "ANALYZER_DATASET_PATH", os.path.join(BASE_DIR, "data", "sample_realestate.xlsx")
+)
+
+# Read workbooks with analyzer.xlsx_reader instead of openpyxl cell objects
+# (same frame, several times faster; unusual sheets still go to pandas).
+ANALYZER_FAST_XLSX_READER = os.getenv("ANALYZER_FAST_XLSX_READER", "True").lower() == "true"
+
+# Host-wide directory where the normalized dataset is published for all
+# gunicorn workers to memory-map. Set to an empty string to disable.
+ANALYZER_SHARED_DATASET_DIR = os.getenv(
+    "ANALYZER_SHARED_DATASET_DIR",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else "/tmp", "realestate-analyzer"),
+)
+
+# Keep uploaded workbooks in MEDIA_ROOT (needed to export results of an
+# upload later). Off by default: uploads are parsed in memory and dropped.
+ANALYZER_RETAIN_UPLOADS = os.getenv("ANALYZER_RETAIN_UPLOADS", "False").lower() == "true"
+
+# Memory budget (bytes) for parsed uploads kept per worker, keyed by content
+# hash, so re-uploading the same workbook skips parsing.
+ANALYZER_UPLOAD_CACHE_BYTES = int(os.getenv("ANALYZER_UPLOAD_CACHE_BYTES", str(256 * 1024 * 1024)))
+
+# Retained uploads of at least this many bytes, analyzed for the first time
+# with a query naming areas, are read partially: only matching rows and
+# needed columns (analyzer.pushdown). 0 disables it.
+ANALYZER_UPLOAD_PUSHDOWN_BYTES = int(os.getenv("ANALYZER_UPLOAD_PUSHDOWN_BYTES", str(8 * 1024 * 1024)))
+
+# Seconds an uploaded dataset stays queryable by dataset_id after its last
+# use. Retained uploads can be re-parsed after that.
+ANALYZER_UPLOAD_TTL = int(os.getenv("ANALYZER_UPLOAD_TTL", "3600"))
+
+# How long (seconds) a result_id returned by /api/analyze/ can be downloaded.
+# Result specs are stored in the database (run `migrate`), so any worker
+# can serve the download.
+ANALYZER_RESULT_TTL = int(os.getenv("ANALYZER_RESULT_TTL", "3600"))
+
+# How long (seconds) a full /api/analyze/ response for the bundled dataset is
+# cached per (dataset version, query). 0 disables the response cache.
+ANALYZER_RESPONSE_CACHE_TTL = int(os.getenv("ANALYZER_RESPONSE_CACHE_TTL", "600"))
+
+# Seconds a request waits for the LLM rewrite of its summary before
+# answering with the template summary.
+ANALYZER_LLM_TIMEOUT = float(os.getenv("ANALYZER_LLM_TIMEOUT", "2.5"))
+
+# Outbound LLM calls: API endpoint override (e.g. a local stub), per-call
+# HTTP timeout, cap on concurrent calls, and the circuit breaker that skips
+# the LLM for a cool-down after repeated failures.
+GROK_BASE_URL = os.getenv("GROK_BASE_URL") or None
+ANALYZER_LLM_CALL_TIMEOUT = float(os.getenv("ANALYZER_LLM_CALL_TIMEOUT", "15"))
+ANALYZER_LLM_MAX_CONCURRENCY = int(os.getenv("ANALYZER_LLM_MAX_CONCURRENCY", "4"))
+ANALYZER_LLM_BREAKER_THRESHOLD = int(os.getenv("ANALYZER_LLM_BREAKER_THRESHOLD", "5"))
+ANALYZER_LLM_BREAKER_COOLDOWN = float(os.getenv("ANALYZER_LLM_BREAKER_COOLDOWN", "30"))
+
+# LLM rewrites are cached per prompt: in memory (up to ANALYZER_LLM_CACHE_SIZE
+# entries) and in the database, for ANALYZER_LLM_CACHE_TTL seconds.
+ANALYZER_LLM_CACHE_SIZE = int(os.getenv("ANALYZER_LLM_CACHE_SIZE", "1024"))
+ANALYZER_LLM_CACHE_TTL = int(os.getenv("ANALYZER_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
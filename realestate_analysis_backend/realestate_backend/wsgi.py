@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'realestate_backend.settings')
 
 application = get_wsgi_application()
+
+# Publish the bundled dataset to shared memory before serving. Under
+# `gunicorn --preload` this runs once in the master; otherwise each worker
+# attaches to whichever copy was published first.
+from analyzer.shared_dataset import publish_bundled_dataset  # noqa: E402
+
+publish_bundled_dataset()